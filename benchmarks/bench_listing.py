@@ -0,0 +1,164 @@
+﻿"""
+Benchmark: Keyset-Pagination für GET /runs und GET /projects bei 1M Runs.
+
+    python benchmarks/bench_listing.py [--runs 1000000] [--projects 1000]
+
+Legt eine Wegwerf-DB in einem Temp-Ordner an; data/lokal_agent.db bleibt unberührt.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import text
+
+from lokal_agent.core.config import AppConfig
+from lokal_agent.core.storage.db import encode_cursor, init_db, list_projects_page, list_runs_page, make_engine
+from lokal_agent.core.storage.models import Project, Run
+
+
+STATUSES = ("QUEUED", "RUNNING", "COMPLETED", "FAILED")
+
+
+def seed(cfg: AppConfig, n_runs: int, n_projects: int) -> None:
+    # Über die Tabellen-Objekte einfügen: SQLAlchemys DateTime-Typ formatiert die Zeitstempel
+    # genau wie beim ORM-Insert (mit Mikrosekunden) – sonst vergleichen die Cursor falsch.
+    engine = make_engine(cfg)
+    base = datetime(2024, 1, 1)
+    rnd = random.Random(42)
+    with engine.begin() as conn:
+        conn.execute(
+            Project.__table__.insert(),
+            [
+                {
+                    "id": i,
+                    "name": f"p{i}",
+                    "path": f"/projects/p{i}",
+                    "created_at": base,
+                    # jedes 10. Projekt nie benutzt -> NULL-Block am Ende der Liste
+                    "last_used_at": None if i % 10 == 0 else base + timedelta(minutes=rnd.randrange(10**6)),
+                }
+                for i in range(1, n_projects + 1)
+            ],
+        )
+        batch = 50_000
+        for start in range(0, n_runs, batch):
+            conn.execute(
+                Run.__table__.insert(),
+                [
+                    {
+                        "project_id": rnd.randint(1, n_projects),
+                        "status": rnd.choice(STATUSES),
+                        "start_message": "bench",
+                        "created_at": base + timedelta(seconds=i),
+                    }
+                    for i in range(start, min(start + batch, n_runs))
+                ],
+            )
+
+
+def check_pages(fn, pages: int) -> None:
+    """Cursor-Walk darf keine Zeile doppelt liefern."""
+    seen: set[int] = set()
+    total = 0
+    cursor = None
+    for _ in range(pages):
+        items, cursor = fn(cursor)
+        total += len(items)
+        seen.update(item.id for item in items)
+        if cursor is None:
+            break
+    if len(seen) != total:
+        raise SystemExit(f"cursor walk returned duplicates: {total} rows, {len(seen)} unique")
+    print(f"cursor walk ok: {total} rows, all unique")
+
+
+def timed(label: str, fn, repeat: int = 20) -> None:
+    fn()  # warmup
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    ms = (time.perf_counter() - t0) / repeat * 1000
+    print(f"{label:<48} {ms:8.2f} ms")
+
+
+def walk_pages(fn, pages: int) -> None:
+    cursor = None
+    for _ in range(pages):
+        _, cursor = fn(cursor)
+        if cursor is None:
+            break
+
+
+def deep_projects_cursor(cfg: AppConfig, n_projects: int) -> str:
+    """Cursor bei ~80 % der Liste – noch vor dem NULL-Block (jedes 10. Projekt)."""
+    with make_engine(cfg).connect() as conn:
+        row = conn.execute(
+            Project.__table__.select()
+            .where(Project.__table__.c.last_used_at.is_not(None))
+            .order_by(Project.__table__.c.last_used_at.desc(), Project.__table__.c.id.desc())
+            .limit(1)
+            .offset(int(n_projects * 0.8))
+        ).first()
+    return encode_cursor(row.last_used_at, row.id)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=1_000_000)
+    ap.add_argument("--projects", type=int, default=1_000)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data = Path(tmp)
+        cfg = AppConfig(data_dir=data, db_path=data / "bench.db", runs_dir=data / "runs", reports_dir=data / "reports")
+        init_db(cfg)
+
+        t0 = time.perf_counter()
+        seed(cfg, args.runs, args.projects)
+        print(f"seed {args.runs} runs / {args.projects} projects: {time.perf_counter() - t0:.1f} s")
+        check_pages(lambda c: list_runs_page(cfg, limit=50, cursor=c), 100)
+        check_pages(lambda c: list_projects_page(cfg, limit=50, cursor=c), 100)
+
+        timed("GET /runs first page (50)", lambda: list_runs_page(cfg, limit=50))
+        timed("GET /runs?status=FAILED first page", lambda: list_runs_page(cfg, limit=50, status="FAILED"))
+        timed("GET /runs?project_id=7 first page", lambda: list_runs_page(cfg, limit=50, project_id=7))
+        timed(
+            "GET /runs 100 pages via cursor",
+            lambda: walk_pages(lambda c: list_runs_page(cfg, limit=50, cursor=c), 100),
+            repeat=3,
+        )
+        timed("GET /projects first page (50)", lambda: list_projects_page(cfg, limit=50))
+        deep_project = deep_projects_cursor(cfg, args.projects)
+        timed(
+            "GET /projects page at ~80% (cursor)",
+            lambda: list_projects_page(cfg, limit=50, cursor=deep_project),
+        )
+
+        engine = make_engine(cfg)
+        with engine.connect() as conn:
+            deep = conn.execute(text("SELECT id FROM run ORDER BY created_at DESC, id DESC LIMIT 1 OFFSET 900000")).first()
+            print(f"(OFFSET 900000 zum Vergleich: id={deep[0] if deep else None})")
+            timed(
+                "OFFSET 900000 (ohne Keyset)",
+                lambda: conn.execute(text("SELECT * FROM run ORDER BY created_at DESC, id DESC LIMIT 50 OFFSET 900000")).all(),
+                repeat=3,
+            )
+            plan = conn.execute(text(
+                "EXPLAIN QUERY PLAN SELECT * FROM run WHERE status = 'FAILED' "
+                "AND (created_at, id) < ('2024-01-02', 100) ORDER BY created_at DESC, id DESC LIMIT 51"
+            )).all()
+            print("plan:", "; ".join(row[-1] for row in plan))
+            plan = conn.execute(text(
+                "EXPLAIN QUERY PLAN SELECT * FROM project WHERE last_used_at IS NOT NULL "
+                "AND (last_used_at, id) < ('2025-01-01', 100) ORDER BY last_used_at DESC, id DESC LIMIT 51"
+            )).all()
+            print("plan /projects:", "; ".join(row[-1] for row in plan))
+
+
+if __name__ == "__main__":
+    main()
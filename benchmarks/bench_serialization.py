@@ -0,0 +1,85 @@
+﻿"""
+Benchmark: Serialisierung von GET /runs/{id}/messages.
+
+    python benchmarks/bench_serialization.py [--messages 100000]
+
+Vergleicht den alten Weg (ORM-Objekte -> dicts -> jsonable_encoder -> JSONResponse)
+mit FastJSONResponse und NDJSON-Streaming, jeweils inkl. DB-Lesen aus einer Wegwerf-DB.
+"""
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from lokal_agent.api.serialization import FastJSONResponse, dumps, ndjson_stream, orjson
+from lokal_agent.core.config import AppConfig
+from lokal_agent.core.storage.db import init_db, iter_message_rows, list_messages, make_engine
+from lokal_agent.core.storage.models import Message
+
+
+def seed(cfg: AppConfig, n: int) -> None:
+    base = datetime(2024, 1, 1)
+    content = "Indexiere Projekt und erstelle Report… " * 8
+    # über die Tabelle einfügen: DateTime-Format wie beim ORM-Insert (siehe bench_listing.seed)
+    with make_engine(cfg).begin() as conn:
+        conn.execute(
+            Message.__table__.insert(),
+            [
+                {
+                    "run_id": 1,
+                    "role": "assistant" if i % 2 else "user",
+                    "content": content,
+                    "ts": base + timedelta(milliseconds=i),
+                }
+                for i in range(n)
+            ],
+        )
+
+
+def timed(label: str, fn, repeat: int = 5) -> None:
+    fn()  # warmup
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        size = fn()
+    ms = (time.perf_counter() - t0) / repeat * 1000
+    print(f"{label:<52} {ms:9.1f} ms  ({size / 1e6:.1f} MB)")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=100_000)
+    args = ap.parse_args()
+
+    print(f"JSON-Backend: {'orjson' if orjson is not None else 'stdlib json'}")
+    with tempfile.TemporaryDirectory() as tmp:
+        data = Path(tmp)
+        cfg = AppConfig(data_dir=data, db_path=data / "bench.db", runs_dir=data / "runs", reports_dir=data / "reports")
+        init_db(cfg)
+        seed(cfg, args.messages)
+
+        def legacy() -> int:
+            rows = [{"role": m.role, "content": m.content, "ts": m.ts} for m in list_messages(cfg, 1)]
+            return len(JSONResponse(jsonable_encoder(rows)).body)
+
+        def fast() -> int:
+            return len(FastJSONResponse(list(iter_message_rows(cfg, 1))).body)
+
+        def ndjson() -> int:
+            return sum(len(chunk) for chunk in ndjson_stream(iter_message_rows(cfg, 1)))
+
+        timed("alt: ORM + jsonable_encoder + JSONResponse", legacy)
+        timed("neu: Zeilen-dicts + FastJSONResponse", fast)
+        timed("neu: NDJSON-Stream (gesamt)", ndjson)
+
+        rows = list(iter_message_rows(cfg, 1))
+        timed("nur Encoder: jsonable_encoder + JSONResponse", lambda: len(JSONResponse(jsonable_encoder(rows)).body))
+        timed("nur Encoder: dumps", lambda: len(dumps(rows)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,64 @@
 ﻿from __future__ import annotations
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+import re
+from typing import Any, Dict, List, Optional, Tuple
 
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+
+from lokal_agent.api.schemas import (
+    MessageOut,
+    ProjectPage,
+    RunCreateIn,
+    RunCreateOut,
+    RunOut,
+    RunPage,
+)
+from lokal_agent.api.serialization import NDJSON_MEDIA_TYPE, FastJSONResponse, ndjson_stream
 from lokal_agent.core.config import AppConfig
-from lokal_agent.core.storage.db import init_db, upsert_project, create_run, get_run, list_messages
+from lokal_agent.core.indexing.watcher import start_index_watcher
+from lokal_agent.core.storage.cache import LRUCache
+from lokal_agent.core.storage.db import (
+    init_db,
+    upsert_project,
+    create_run,
+    get_run,
+    iter_message_rows,
+    list_runs_page,
+    list_projects_page,
+)
+from lokal_agent.core.storage.models import Project, Run
+from lokal_agent.core.storage.reports import ReportBlob, load_report
+from lokal_agent.core.storage.retention import RetentionPolicy, start_retention
 from lokal_agent.core.agent.runner import run_agent, DummyAgent
 
 
 cfg = AppConfig()
 init_db(cfg)
+if cfg.index_watcher:
+    start_index_watcher(cfg)
+
+app = FastAPI(title="Lokal-GbtAgent API", default_response_class=FastJSONResponse)
+
+# Abgeschlossene Runs (und ihre Reports) ändern sich nicht mehr -> im Speicher halten.
+FINISHED_STATUSES = ("COMPLETED", "FAILED")
+_run_cache: LRUCache[int, Dict[str, Any]] = LRUCache(maxsize=256)
+_report_cache: LRUCache[int, ReportBlob] = LRUCache(maxsize=32)
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
 
-app = FastAPI(title="Lokal-GbtAgent API")
+def _forget_runs(run_ids: list[int]) -> None:
+    for run_id in run_ids:
+        _run_cache.pop(run_id)
+        _report_cache.pop(run_id)
 
 
-class RunCreateIn(BaseModel):
-    project_path: str
-    start_message: str
+if RetentionPolicy.from_config(cfg).enabled:
+    start_retention(cfg, on_archived=_forget_runs)
 
 
-@app.post("/runs")
+@app.post("/runs", response_model=RunCreateOut)
 def create_run_endpoint(payload: RunCreateIn):
     proj = upsert_project(cfg, payload.project_path)
     run = create_run(cfg, proj.id, payload.start_message)
@@ -32,14 +71,10 @@ def create_run_endpoint(payload: RunCreateIn):
         r = get_run(cfg, run.id)
         raise HTTPException(status_code=500, detail={"run_id": run.id, "status": r.status if r else "UNKNOWN", "error": str(e)})
 
-    return {"run_id": run.id, "status": "COMPLETED", "final": final.model_dump()}
+    return FastJSONResponse({"run_id": run.id, "status": "COMPLETED", "final": final.model_dump()})
 
 
-@app.get("/runs/{run_id}")
-def get_run_endpoint(run_id: int):
-    r = get_run(cfg, run_id)
-    if not r:
-        raise HTTPException(status_code=404, detail="run not found")
+def _run_to_dict(r: Run) -> Dict[str, Any]:
     return {
         "run_id": r.id,
         "project_id": r.project_id,
@@ -51,13 +86,170 @@ def get_run_endpoint(run_id: int):
     }
 
 
-@app.get("/runs/{run_id}/messages")
-def get_run_messages(run_id: int):
+def _project_to_dict(p: Project) -> Dict[str, Any]:
+    return {
+        "project_id": p.id,
+        "name": p.name,
+        "path": p.path,
+        "created_at": p.created_at,
+        "last_used_at": p.last_used_at,
+    }
+
+
+def _run_payload(run_id: int) -> Optional[Dict[str, Any]]:
+    cached = _run_cache.get(run_id)
+    if cached is not None:
+        return cached
+
     r = get_run(cfg, run_id)
     if not r:
+        return None
+    payload = _run_to_dict(r)
+    if r.status in FINISHED_STATUSES:
+        _run_cache.put(run_id, payload)
+    return payload
+
+
+@app.get("/runs", response_model=RunPage)
+def list_runs_endpoint(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    project_id: Optional[int] = None,
+):
+    try:
+        runs, next_cursor = list_runs_page(cfg, limit=limit, cursor=cursor, status=status, project_id=project_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse({"items": [_run_to_dict(r) for r in runs], "next_cursor": next_cursor})
+
+
+@app.get("/projects", response_model=ProjectPage)
+def list_projects_endpoint(limit: int = Query(50, ge=1, le=500), cursor: Optional[str] = None):
+    try:
+        projects, next_cursor = list_projects_page(cfg, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse({"items": [_project_to_dict(p) for p in projects], "next_cursor": next_cursor})
+
+
+@app.get("/runs/{run_id}", response_model=RunOut)
+def get_run_endpoint(run_id: int):
+    payload = _run_payload(run_id)
+    if not payload:
+        raise HTTPException(status_code=404, detail="run not found")
+    return FastJSONResponse(payload)
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Einzelner Byte-Range (`bytes=a-b`, `bytes=a-`, `bytes=-n`) -> (start, end) inklusiv."""
+    m = _RANGE_RE.match(header.strip())
+    if not m or (not m.group(1) and not m.group(2)):
+        raise ValueError(header)
+    if m.group(1):
+        start = int(m.group(1))
+        end = int(m.group(2)) if m.group(2) else size - 1
+    else:
+        start = max(size - int(m.group(2)), 0)
+        end = size - 1
+    end = min(end, size - 1)
+    if start > end:
+        return None
+    return start, end
+
+
+def _matching_etag(if_none_match: str, *etags: str) -> Optional[str]:
+    """Erster eigener ETag, der in If-None-Match vorkommt (`*` -> der erste)."""
+    if if_none_match.strip() == "*":
+        return etags[0]
+    candidates = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return next((e for e in etags if e in candidates), None)
+
+
+def _accepts_encoding(accept_encoding: str, coding: str) -> bool:
+    """Accept-Encoding inkl. q-Werten: `gzip;q=0` (oder `*;q=0` ohne gzip) schließt gzip aus."""
+    q_by_coding: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, val = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(val)
+                except ValueError:
+                    q = 0.0
+        q_by_coding[name] = q
+    q = q_by_coding.get(coding, q_by_coding.get("*", 0.0))
+    return q > 0
+
+
+@app.get("/runs/{run_id}/report")
+def get_run_report(run_id: int, request: Request):
+    blob = _report_cache.get(run_id)
+    if blob is None:
+        payload = _run_payload(run_id)
+        if not payload:
+            raise HTTPException(status_code=404, detail="run not found")
+        if payload["status"] != "COMPLETED":
+            raise HTTPException(status_code=409, detail={"run_id": run_id, "status": payload["status"]})
+        blob = load_report(cfg, run_id)
+        if blob is None:
+            raise HTTPException(status_code=404, detail="report not found")
+        _report_cache.put(run_id, blob)
+
+    headers = {
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Accept-Ranges": "bytes",
+        "Vary": "Accept-Encoding",
+    }
+    media_type = "text/markdown; charset=utf-8"
+
+    inm = request.headers.get("if-none-match")
+    matched = _matching_etag(inm, blob.etag, blob.gz_etag) if inm else None
+    if matched:
+        return Response(status_code=304, headers={**headers, "ETag": matched})
+
+    range_header = request.headers.get("range")
+    size = len(blob.data)
+    rng: Optional[Tuple[int, int]] = None
+    if range_header:
+        try:
+            rng = _parse_range(range_header, size)
+        except ValueError:
+            range_header = None  # ungültige Range-Syntax wird ignoriert (RFC 9110)
+    if range_header:
+        if rng is None:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        start, end = rng
+        return Response(
+            content=blob.data[start:end + 1],
+            status_code=206,
+            media_type=media_type,
+            headers={**headers, "ETag": blob.etag, "Content-Range": f"bytes {start}-{end}/{size}"},
+        )
+
+    if _accepts_encoding(request.headers.get("accept-encoding", ""), "gzip"):
+        return Response(
+            content=blob.gz,
+            media_type=media_type,
+            headers={**headers, "ETag": blob.gz_etag, "Content-Encoding": "gzip"},
+        )
+    return Response(content=blob.data, media_type=media_type, headers={**headers, "ETag": blob.etag})
+
+
+@app.get("/runs/{run_id}/messages", response_model=List[MessageOut])
+def get_run_messages(run_id: int, request: Request, format: Optional[str] = None):
+    if not _run_payload(run_id):
         raise HTTPException(status_code=404, detail="run not found")
-    msgs = list_messages(cfg, run_id)
-    return [{"role": m.role, "content": m.content, "ts": m.ts} for m in msgs]
+
+    # Große Historien als NDJSON streamen (?format=ndjson oder Accept: application/x-ndjson)
+    if format == "ndjson" or NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        return StreamingResponse(ndjson_stream(iter_message_rows(cfg, run_id)), media_type=NDJSON_MEDIA_TYPE)
+    return FastJSONResponse(list(iter_message_rows(cfg, run_id)))
 
 
 def main():
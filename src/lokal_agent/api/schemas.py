@@ -0,0 +1,55 @@
+﻿from __future__ import annotations
+
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from lokal_agent.core.agent.protocol import FinalReport
+
+
+class RunCreateIn(BaseModel):
+    project_path: str
+    start_message: str
+
+
+# Response-Modelle für OpenAPI; die Handler serialisieren direkt (FastJSONResponse),
+# daher keine Validierung pro Request.
+class RunOut(BaseModel):
+    run_id: int
+    project_id: int
+    status: str
+    start_message: str
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+
+class RunCreateOut(BaseModel):
+    run_id: int
+    status: str
+    final: FinalReport
+
+
+class RunPage(BaseModel):
+    items: List[RunOut]
+    next_cursor: Optional[str] = None
+
+
+class ProjectOut(BaseModel):
+    project_id: int
+    name: str
+    path: str
+    created_at: datetime
+    last_used_at: Optional[datetime] = None
+
+
+class ProjectPage(BaseModel):
+    items: List[ProjectOut]
+    next_cursor: Optional[str] = None
+
+
+class MessageOut(BaseModel):
+    role: str
+    content: str
+    ts: datetime
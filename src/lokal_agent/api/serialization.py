@@ -0,0 +1,54 @@
+﻿from __future__ import annotations
+
+import json
+from datetime import date, datetime
+from typing import Any, Iterable, Iterator
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+# Optional: orjson ist deutlich schneller (datetime nativ); sonst stdlib json.
+try:
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    orjson = None  # type: ignore
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON-Response ohne FastAPIs jsonable_encoder-Umweg: Handler geben diese Response direkt zurück,
+    der Inhalt (dicts/Listen mit datetime) wird in einem Schritt serialisiert.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def ndjson_stream(items: Iterable[Any], chunk_bytes: int = 64 * 1024) -> Iterator[bytes]:
+    """Eine JSON-Zeile pro Item; Zeilen werden zu ~64 KB-Chunks gebündelt (weniger Writes)."""
+    buf = bytearray()
+    for item in items:
+        buf += dumps(item)
+        buf += b"\n"
+        if len(buf) >= chunk_bytes:
+            yield bytes(buf)
+            buf.clear()
+    if buf:
+        yield bytes(buf)
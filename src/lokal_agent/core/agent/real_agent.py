@@ -1,18 +1,33 @@
 ﻿from __future__ import annotations
 
+import hashlib
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List
+from typing import Callable, Iterator, Optional, Union
 
 from lokal_agent.core.config import AppConfig, ensure_dirs
 from lokal_agent.core.indexing.indexer import ProjectIndex, build_index
+from lokal_agent.core.indexing.snapshot import IndexSnapshot, open_snapshot, write_snapshot
+from lokal_agent.core.indexing.watcher import get_index_watcher
 from lokal_agent.core.agent.protocol import FinalReport, ArtifactOut
+from lokal_agent.core.storage.blobs import BlobStore, ChunkedArtifactWriter, cas_ref
+from lokal_agent.core.storage.reports import report_url
+
+
+# (Abschnittstitel, Markdown) – wird pro fertig geschriebenem Report-Abschnitt aufgerufen
+SectionCallback = Callable[[str, str], None]
+
+# Frisch gebauter Index oder gemappter Snapshot (gleiche Felder, Snapshot dekodiert lazy)
+IndexView = Union[ProjectIndex, IndexSnapshot]
+
+REPORT_DESCRIPTION = "Projekt-Analyse Report (Markdown)"
 
 
 @dataclass
 class AgentResult:
     report: FinalReport
-    report_path: str
+    report_path: str  # lesbare Adresse (`/runs/<id>/report`); ohne run_id die CAS-Referenz
+    report_ref: str  # Speicher-Schlüssel `cas:<manifest>` (Artefakt-Zeile, load_report, gc)
 
 
 class RealLocalAgent:
@@ -21,21 +36,28 @@ class RealLocalAgent:
     Später ersetzen wir die Report-Generierung durch ein LLM-Backend – die Schnittstelle bleibt.
     """
 
-    def run(self, cfg: AppConfig, project_path: str, start_message: str, run_id: int | None = None) -> AgentResult:
+    def run(
+        self,
+        cfg: AppConfig,
+        project_path: str,
+        start_message: str,
+        run_id: int | None = None,
+        on_section: Optional[SectionCallback] = None,
+    ) -> AgentResult:
         ensure_dirs(cfg)
 
-        idx = build_index(project_path)
+        idx = self._load_index(cfg, project_path)
 
-        report_md = self._render_report(idx, start_message)
-        name = f"run_{run_id or 'na'}_report.md"
-        out_path = (cfg.reports_dir / name).resolve()
-        out_path.write_text(report_md, encoding="utf-8")
+        writer = ChunkedArtifactWriter(BlobStore.for_config(cfg), kind="report")
+        self._write_report(writer, idx, start_message, on_section)
+        report_ref = cas_ref(writer.close())
+        report_path = report_url(run_id) if run_id is not None else report_ref
 
         summary = self._render_summary(idx, start_message)
 
         final = FinalReport(
             summary=summary,
-            artifacts=[ArtifactOut(path=str(out_path), description="Projekt-Analyse Report (Markdown)")],
+            artifacts=[ArtifactOut(path=report_path, description=REPORT_DESCRIPTION)],
             next_steps=[
                 "LLM-Backend anbinden (OpenAI/Local) und Agent als Tool-User laufen lassen",
                 "Index erweitern: große Repos chunking + Embeddings (optional)",
@@ -43,9 +65,33 @@ class RealLocalAgent:
             ],
             done=True,
         )
-        return AgentResult(report=final, report_path=str(out_path))
+        return AgentResult(report=final, report_path=report_path, report_ref=report_ref)
+
+    def _load_index(self, cfg: AppConfig, project_path: str) -> IndexView:
+        watcher = get_index_watcher()
+        listing = watcher.snapshot(project_path) if watcher is not None else None
+
+        use_snapshots = cfg.index_snapshot_max_age > 0
+        # Ohne aktuelle Watcher-Liste: frischen Snapshot eines anderen Prozesses (UI/API/Worker) mappen
+        if use_snapshots and listing is None:
+            snap = open_snapshot(cfg, project_path)
+            if snap is not None and snap.age <= cfg.index_snapshot_max_age:
+                return snap
+
+        idx = build_index(
+            project_path,
+            outline_cache=self._outline_cache_path(cfg, project_path),
+            listing=listing,
+        )
+        if use_snapshots:
+            write_snapshot(cfg, project_path, idx)
+        return idx
+
+    def _outline_cache_path(self, cfg: AppConfig, project_path: str) -> Path:
+        key = hashlib.sha1(str(Path(project_path).resolve()).encode("utf-8")).hexdigest()[:16]
+        return cfg.data_dir / "outline_cache" / f"{key}.json"
 
-    def _render_summary(self, idx: ProjectIndex, start_message: str) -> str:
+    def _render_summary(self, idx: IndexView, start_message: str) -> str:
         return (
             f"Projektindex erstellt: {idx.file_count} Dateien, {idx.total_bytes} Bytes.\n"
             f"Root: {idx.root}\n"
@@ -53,42 +99,89 @@ class RealLocalAgent:
             f"Wichtige Dateien: {', '.join([f.path for f in idx.important]) or '(keine)'}"
         )
 
-    def _render_report(self, idx: ProjectIndex, start_message: str) -> str:
+    def _write_report(
+        self,
+        writer: ChunkedArtifactWriter,
+        idx: IndexView,
+        start_message: str,
+        on_section: Optional[SectionCallback] = None,
+    ) -> None:
+        """
+        Schreibt den Report abschnittsweise (Streaming) als Chunks in den Blob-Store –
+        der Speicherbedarf hängt nicht an der Snippet-Anzahl, unveränderte Abschnitte
+        (z.B. Snippets) früherer Runs werden nicht erneut geschrieben.
+        """
+        for title, text in self._iter_report_sections(idx, start_message):
+            writer.write(text.encode("utf-8"))
+            if on_section is not None:
+                on_section(title, text)
+
+    def _iter_report_sections(self, idx: IndexView, start_message: str) -> Iterator[tuple[str, str]]:
+        def block(*lines: str) -> str:
+            return "\n".join(lines) + "\n"
+
+        yield "Auftrag", block(
+            "# Lokal-GbtAgent Report",
+            "",
+            "## Auftrag",
+            start_message.strip() or "(leer)",
+            "",
+        )
+
+        skipped = idx.skipped
+        yield "Projekt-Überblick", block(
+            "## Projekt-Überblick",
+            f"- Root: `{idx.root}`",
+            f"- Dateien (gezählt/gescannt): **{idx.file_count}**",
+            f"- Gesamtgröße (gezählt/gescannt): **{idx.total_bytes}** bytes",
+            f"- Übersprungen: **{skipped.total}** "
+            f"(ausgeschlossene Ordner: {skipped.excluded_dirs}, "
+            f"ignoriert via .gitignore/.ignore: {skipped.ignored_dirs} Ordner, {skipped.ignored_files} Dateien)",
+            "",
+        )
+
         imp = "\n".join([f"- `{f.path}` ({f.size} bytes)" for f in idx.important]) or "- (keine)"
-        sections: List[str] = []
-
-        sections.append("# Lokal-GbtAgent Report")
-        sections.append("")
-        sections.append("## Auftrag")
-        sections.append(start_message.strip() or "(leer)")
-        sections.append("")
-        sections.append("## Projekt-Überblick")
-        sections.append(f"- Root: `{idx.root}`")
-        sections.append(f"- Dateien (gezählt/gescannt): **{idx.file_count}**")
-        sections.append(f"- Gesamtgröße (gezählt/gescannt): **{idx.total_bytes}** bytes")
-        sections.append("")
-        sections.append("## Wichtige Dateien (heuristisch)")
-        sections.append(imp)
-        sections.append("")
-        sections.append("## Tree Preview (Ausschnitt)")
-        sections.append("```")
-        sections.append(idx.tree_preview or "")
-        sections.append("```")
-        sections.append("")
-
-        sections.append("## Snippets (Ausschnitt)")
+        yield "Wichtige Dateien", block(
+            "## Wichtige Dateien (heuristisch)",
+            imp,
+            "",
+        )
+
+        yield "Tree Preview", block(
+            "## Tree Preview (größte Ordner)",
+            "```",
+            idx.tree_preview or "",
+            "```",
+            "",
+        )
+
+        outline = idx.outline_text
+        if outline:
+            yield "Symbol-Outline", block(
+                "## Symbol-Outline (Python)",
+                "```",
+                outline,
+                "```",
+                "",
+            )
+
+        yield "Snippets", block("## Snippets (Ausschnitt)")
         for f in idx.important:
-            if not f.snippet:
+            snippet = f.snippet
+            if not snippet:
                 continue
-            sections.append(f"### {f.path}")
-            sections.append("```")
-            sections.append(f.snippet)
-            sections.append("```")
-            sections.append("")
-
-        sections.append("## Einschätzung / Nächste Schritte")
-        sections.append("- Projektindex ist vorhanden; als nächstes binden wir ein LLM-Backend an, das auf Basis dieses Index eine planvolle Task-Ausführung macht.")
-        sections.append("- Danach: Completion-Erkennung über FINAL_REPORT-Protokoll + Report-Artefakte.")
-        sections.append("")
-
-        return "\n".join(sections)
+            path = f.path
+            yield f"Snippet: {path}", block(
+                f"### {path}",
+                "```",
+                snippet,
+                "```",
+                "",
+            )
+
+        yield "Einschätzung / Nächste Schritte", block(
+            "## Einschätzung / Nächste Schritte",
+            "- Projektindex ist vorhanden; als nächstes binden wir ein LLM-Backend an, das auf Basis dieses Index eine planvolle Task-Ausführung macht.",
+            "- Danach: Completion-Erkennung über FINAL_REPORT-Protokoll + Report-Artefakte.",
+            "",
+        )
@@ -5,7 +5,8 @@ from typing import Optional
 
 from lokal_agent.core.config import AppConfig
 from lokal_agent.core.agent.protocol import FinalReport
-from lokal_agent.core.agent.real_agent import RealLocalAgent
+from lokal_agent.core.agent.real_agent import REPORT_DESCRIPTION, RealLocalAgent, SectionCallback
+from lokal_agent.core.storage.db import add_artifact, set_run_status
 
 
 # Optional: DB hooks (duck-typing; läuft auch ohne diese Funktionen)
@@ -47,15 +48,38 @@ class DummyAgent:
     pass
 
 
-def run_agent(cfg: AppConfig, _agent: object, run_id: int, project_path: str, start_message: str) -> FinalReport:
+def run_agent(
+    cfg: AppConfig,
+    _agent: object,
+    run_id: int,
+    project_path: str,
+    start_message: str,
+    on_section: Optional[SectionCallback] = None,
+) -> FinalReport:
     _db_try_set_run_status(cfg, run_id, "RUNNING")
     _db_try_add_message(cfg, run_id, "user", start_message)
 
     # Real agent execution
     real = RealLocalAgent()
     _db_try_add_message(cfg, run_id, "assistant", "Indexiere Projekt und erstelle Report…")
-    result = real.run(cfg, project_path=project_path, start_message=start_message, run_id=run_id)
+    def _on_section(title: str, text: str) -> None:
+        if cfg.stream_report_messages:
+            _db_try_add_message(cfg, run_id, "assistant", text)
+        if on_section is not None:
+            on_section(title, text)
 
+    result = real.run(cfg, project_path=project_path, start_message=start_message, run_id=run_id, on_section=_on_section)
+
+    # Artefakt-Zeile hält den Speicher-Schlüssel (cas:…) und ist die einzige Referenz auf den Report
+    # (ohne sie räumt BlobStore.gc ihn ab) -> nicht best-effort: schlägt sie fehl, scheitert der Run.
+    try:
+        add_artifact(cfg, run_id, result.report_ref, "report", REPORT_DESCRIPTION)
+    except Exception as e:
+        try:
+            set_run_status(cfg, run_id, "FAILED", error=f"Report-Artefakt nicht gespeichert: {e}")
+        except Exception:
+            pass
+        raise
     _db_try_add_message(cfg, run_id, "assistant", f"Report erstellt: {result.report_path}")
     _db_try_set_run_status(cfg, run_id, "COMPLETED")
     return result.report
@@ -2,6 +2,7 @@
 
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Optional
 
 
 @dataclass(frozen=True)
@@ -10,9 +11,21 @@ class AppConfig:
     db_path: Path = Path("data") / "lokal_agent.db"
     runs_dir: Path = Path("data") / "runs"
     reports_dir: Path = Path("data") / "reports"
+    archive_dir: Path = Path("data") / "archive"
 
     # Agent behavior
     max_steps: int = 6
+    # Report-Abschnitte zusätzlich als Run-Messages veröffentlichen (Teil-Reports früh sichtbar)
+    stream_report_messages: bool = False
+    # Hintergrund-Watcher hält Dateilisten zuletzt benutzter Projekte aktuell (kein Walk pro Run)
+    index_watcher: bool = False
+    # Gemeinsame mmap-Index-Snapshots (data/index): max. Alter in Sekunden, 0 = aus
+    index_snapshot_max_age: float = 0.0
+
+    # Retention (None = unbegrenzt): ältere/überzählige abgeschlossene Runs werden nach data/archive verschoben
+    retention_max_age_days: Optional[int] = None
+    retention_keep_per_project: Optional[int] = None
+    retention_interval_s: float = 3600.0
 
 
 def ensure_dirs(cfg: AppConfig) -> None:
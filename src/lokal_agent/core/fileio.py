@@ -0,0 +1,45 @@
+﻿from __future__ import annotations
+
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+
+@contextmanager
+def atomic_open(path: Path, *, fsync: bool = False) -> Iterator[BinaryIO]:
+    """
+    Öffnet eine eindeutige Temp-Datei (mkstemp im Zielordner) zum Schreiben; nach dem Block
+    flush (+ fsync) und os.replace aufs Ziel. Bei einem Fehler wird die Temp-Datei entfernt.
+    fsync auf dem eigenen Schreib-Handle – unter Windows braucht os.fsync Schreibzugriff.
+    """
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            yield fh
+            fh.flush()
+            if fsync:
+                os.fsync(fh.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_bytes(path: Path, data: bytes, *, identical_ok: bool = False, fsync: bool = False) -> None:
+    """
+    Schreibt `data` atomar (siehe atomic_open).
+    identical_ok: Ziel ist inhaltsgleich per Konstruktion (z.B. Content-Hash im Namen) –
+    schlägt replace fehl, weil ein anderer Thread/Prozess es gerade geschrieben hat, gilt das als Erfolg.
+    """
+    try:
+        with atomic_open(path, fsync=fsync) as fh:
+            fh.write(data)
+    except OSError:
+        if identical_ok and path.exists():
+            return
+        raise
@@ -0,0 +1,151 @@
+﻿from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional, Pattern, Tuple
+
+
+IGNORE_FILENAMES = (".gitignore", ".ignore")
+
+
+def _translate(pat: str) -> str:
+    """gitignore-Glob -> Regex (ohne Anker). `*`/`?` matchen kein `/`, `**/` beliebig viele Ebenen."""
+    res: List[str] = []
+    i, n = 0, len(pat)
+    while i < n:
+        c = pat[i]
+        if c == "*":
+            if pat.startswith("**/", i):
+                res.append("(?:.*/)?")
+                i += 3
+                continue
+            if pat.startswith("**", i):
+                res.append(".*")
+                i += 2
+                continue
+            res.append("[^/]*")
+        elif c == "?":
+            res.append("[^/]")
+        elif c == "[":
+            j = pat.find("]", i + 2)
+            if j == -1:
+                res.append(re.escape(c))
+            else:
+                body = pat[i + 1:j].replace("\\", "\\\\")
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                res.append(f"[{body}]")
+                i = j
+        elif c == "\\" and i + 1 < n:
+            res.append(re.escape(pat[i + 1]))
+            i += 2
+            continue
+        else:
+            res.append(re.escape(c))
+        i += 1
+    return "".join(res)
+
+
+@dataclass
+class IgnoreRule:
+    regex: Pattern[str]
+    negate: bool
+    dir_only: bool
+
+
+def parse_rule(line: str) -> Optional[IgnoreRule]:
+    if line.endswith("\\ "):
+        line = line.rstrip("\n")
+    else:
+        line = line.rstrip()
+    if not line or line.startswith("#"):
+        return None
+
+    negate = line.startswith("!")
+    if negate:
+        line = line[1:]
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+
+    # Pattern mit `/` (außer am Ende) sind relativ zum Verzeichnis der Ignore-Datei verankert.
+    anchored = "/" in line
+    body = _translate(line.lstrip("/"))
+    if not anchored:
+        body = "(?:.*/)?" + body
+    return IgnoreRule(regex=re.compile(f"^{body}$"), negate=negate, dir_only=dir_only)
+
+
+class IgnoreMatcher:
+    """
+    Alle Regeln der Ignore-Dateien *eines* Verzeichnisses, einmal kompiliert.
+    Ohne Negationen (`!`) reicht eine einzige Alternation pro Eintragstyp;
+    sonst gilt gitignore-Semantik "letzte passende Regel gewinnt".
+    """
+
+    def __init__(self, base: Path, rules: List[IgnoreRule]) -> None:
+        self.base = base
+        self.rules = rules
+        self._fast: Optional[Tuple[Optional[Pattern[str]], Optional[Pattern[str]]]] = None
+        if not any(r.negate for r in rules):
+            self._fast = (
+                self._union([r for r in rules if not r.dir_only]),
+                self._union(rules),
+            )
+
+    @staticmethod
+    def _union(rules: List[IgnoreRule]) -> Optional[Pattern[str]]:
+        if not rules:
+            return None
+        return re.compile("|".join(f"(?:{r.regex.pattern})" for r in rules))
+
+    @classmethod
+    def from_dir(cls, directory: Path) -> Optional["IgnoreMatcher"]:
+        rules: List[IgnoreRule] = []
+        for name in IGNORE_FILENAMES:
+            p = directory / name
+            try:
+                text = p.read_text(encoding="utf-8", errors="ignore")
+            except OSError:
+                continue
+            for line in text.splitlines():
+                rule = parse_rule(line)
+                if rule is not None:
+                    rules.append(rule)
+        return cls(directory, rules) if rules else None
+
+    def match(self, rel: str, is_dir: bool) -> Optional[bool]:
+        """True = ignoriert, False = explizit wieder aufgenommen (`!`), None = keine Regel passt."""
+        if self._fast is not None:
+            rx = self._fast[1] if is_dir else self._fast[0]
+            return True if rx is not None and rx.match(rel) else None
+        for rule in reversed(self.rules):
+            if rule.dir_only and not is_dir:
+                continue
+            if rule.regex.match(rel):
+                return not rule.negate
+        return None
+
+
+@dataclass
+class IgnoreChain:
+    """Matcher vom Root bis zum aktuellen Verzeichnis; tiefere Dateien haben Vorrang."""
+
+    matchers: List[Tuple[IgnoreMatcher, str]] = field(default_factory=list)  # (matcher, rel. Präfix)
+
+    def descend(self, name: str) -> "IgnoreChain":
+        return IgnoreChain([(m, f"{prefix}{name}/") for m, prefix in self.matchers])
+
+    def extend(self, own: Optional[IgnoreMatcher]) -> "IgnoreChain":
+        if own is None:
+            return self
+        return IgnoreChain(self.matchers + [(own, "")])
+
+    def is_ignored(self, name: str, is_dir: bool) -> bool:
+        for m, prefix in reversed(self.matchers):
+            verdict = m.match(prefix + name, is_dir)
+            if verdict is not None:
+                return verdict
+        return False
@@ -1,9 +1,13 @@
 ﻿from __future__ import annotations
 
+import heapq
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Iterable, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from lokal_agent.core.indexing.ignore import IgnoreChain, IgnoreMatcher
+from lokal_agent.core.indexing.outline import ModuleOutline, build_outline, render_outline
 
 
 DEFAULT_EXCLUDE_DIRS = {
@@ -32,6 +36,99 @@ class IndexedFile:
     snippet: str = ""
 
 
+@dataclass
+class WalkStats:
+    """Einträge, die der Walker gar nicht erst betreten/gestat'et hat."""
+    excluded_dirs: int = 0  # DEFAULT_EXCLUDE_DIRS / exclude_dirs
+    ignored_dirs: int = 0  # .gitignore / .ignore
+    ignored_files: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.excluded_dirs + self.ignored_dirs + self.ignored_files
+
+
+@dataclass
+class DirNode:
+    name: str
+    files: int = 0  # rekursiv
+    bytes: int = 0  # rekursiv
+    children: Dict[str, "DirNode"] = field(default_factory=dict)
+
+
+class DirTree:
+    """
+    Aggregiert Dateianzahl und Größe pro Ordner in einem Durchlauf während des Walks.
+    Dateien unterhalb von max_depth zählen zum Vorfahren auf max_depth (Baum bleibt klein).
+    """
+
+    def __init__(self, root: Path, max_depth: int = 6) -> None:
+        self.root_path = root
+        self.max_depth = max_depth
+        self.root = DirNode(root.name or str(root))
+        self._chains: Dict[str, List[DirNode]] = {}  # Ordner -> Knoten vom Root bis dorthin
+
+    def _chain(self, directory: str) -> List[DirNode]:
+        chain = self._chains.get(directory)
+        if chain is not None:
+            return chain
+        try:
+            parts = Path(directory).relative_to(self.root_path).parts[:self.max_depth]
+        except ValueError:
+            parts = ()
+        chain = [self.root]
+        node = self.root
+        for part in parts:
+            child = node.children.get(part)
+            if child is None:
+                child = node.children[part] = DirNode(part)
+            chain.append(child)
+            node = child
+        self._chains[directory] = chain
+        return chain
+
+    def add(self, path: Path, size: int) -> None:
+        # Walk liefert Dateien ordnerweise -> ein Dict-Lookup pro Datei
+        for node in self._chain(os.path.dirname(path)):
+            node.files += 1
+            node.bytes += size
+
+    def render(self, max_depth: int = 3, top_k: int = 8, max_lines: int = 120) -> str:
+        """Top-k Unterordner je Ebene (nach Bytes, dann Dateianzahl) per Heap-Auswahl statt Sortierung."""
+        lines = [f"{self.root.name}/  ({self.root.files} Dateien, {_fmt_bytes(self.root.bytes)})"]
+
+        def visit(node: DirNode, depth: int) -> None:
+            if depth > max_depth or not node.children:
+                return
+            indent = "  " * depth
+            top = heapq.nlargest(top_k, node.children.values(), key=lambda n: (n.bytes, n.files))
+            for child in top:
+                if len(lines) >= max_lines:
+                    return
+                lines.append(f"{indent}{child.name}/  ({child.files} Dateien, {_fmt_bytes(child.bytes)})")
+                visit(child, depth + 1)
+            rest = len(node.children) - len(top)
+            if rest > 0 and len(lines) < max_lines:
+                rest_files = node.files - sum(c.files for c in top)
+                lines.append(f"{indent}... (+{rest} weitere Ordner; {rest_files} Dateien dort oder direkt hier)")
+
+        visit(self.root, 1)
+        if len(lines) >= max_lines:
+            lines.append("... (gekürzt)")
+        return "\n".join(lines)
+
+
+def _fmt_bytes(n: int) -> str:
+    if n < 1024:
+        return f"{n} B"
+    size = float(n)
+    for unit in ("KB", "MB", "GB"):
+        size /= 1024
+        if size < 1024 or unit == "GB":
+            break
+    return f"{size:.1f} {unit}"
+
+
 @dataclass
 class ProjectIndex:
     root: str
@@ -39,13 +136,30 @@ class ProjectIndex:
     total_bytes: int
     important: List[IndexedFile]
     tree_preview: str
+    outline: List[ModuleOutline] = field(default_factory=list)
+    skipped: WalkStats = field(default_factory=WalkStats)
+
+    @property
+    def outline_text(self) -> str:
+        return render_outline(self.outline) if self.outline else ""
 
 
-def _is_probably_text(path: Path) -> bool:
+@dataclass
+class FileListing:
+    """Vorab bekannte Dateiliste (z.B. vom Index-Watcher) – build_index muss dann nicht walken."""
+    entries: List[Tuple[Path, int]]  # (absoluter Pfad, Größe)
+    skipped: WalkStats = field(default_factory=WalkStats)
+
+
+def _is_probably_text(path: Path, size: Optional[int] = None) -> bool:
     if path.suffix.lower() in DEFAULT_TEXT_EXTS:
         return True
     # fallback: small files without extension (e.g. LICENSE)
-    return path.suffix == "" and path.stat().st_size < 200_000
+    if path.suffix != "":
+        return False
+    if size is None:
+        size = path.stat().st_size
+    return size < 200_000
 
 
 def _safe_read_text(path: Path, max_chars: int) -> str:
@@ -59,14 +173,57 @@ def _safe_read_text(path: Path, max_chars: int) -> str:
     return data
 
 
-def _walk_files(root: Path, exclude_dirs: set[str]) -> Iterable[Path]:
+def _walk_files(
+    root: Path,
+    exclude_dirs: set[str],
+    stats: Optional[WalkStats] = None,
+    use_ignore_files: bool = True,
+    dirs_out: Optional[List[str]] = None,
+) -> Iterable[Path]:
+    stats = stats if stats is not None else WalkStats()
+    chains = {str(root): IgnoreChain()}
+
     for dirpath, dirnames, filenames in os.walk(root):
-        # prune dirs
-        dirnames[:] = [d for d in dirnames if d not in exclude_dirs]
+        if dirs_out is not None:
+            dirs_out.append(dirpath)
+        chain = chains.pop(dirpath, IgnoreChain())
+        if use_ignore_files:
+            chain = chain.extend(IgnoreMatcher.from_dir(Path(dirpath)))
+
+        # prune dirs (before descent)
+        kept = []
+        for d in dirnames:
+            if d in exclude_dirs:
+                stats.excluded_dirs += 1
+            elif chain.matchers and chain.is_ignored(d, is_dir=True):
+                stats.ignored_dirs += 1
+            else:
+                kept.append(d)
+                if chain.matchers:
+                    chains[os.path.join(dirpath, d)] = chain.descend(d)
+        dirnames[:] = kept
+
         for fn in filenames:
+            if chain.matchers and chain.is_ignored(fn, is_dir=False):
+                stats.ignored_files += 1
+                continue
             yield Path(dirpath) / fn
 
 
+def iter_sized_files(
+    root: Path,
+    exclude_dirs: set[str],
+    stats: Optional[WalkStats] = None,
+    use_ignore_files: bool = True,
+    dirs_out: Optional[List[str]] = None,
+) -> Iterator[Tuple[Path, int]]:
+    for p in _walk_files(root, exclude_dirs, stats, use_ignore_files, dirs_out):
+        try:
+            yield p, p.stat().st_size
+        except OSError:
+            continue
+
+
 def build_index(
     project_root: str,
     *,
@@ -75,6 +232,10 @@ def build_index(
     max_snippet_chars: int = 3000,
     important_limit: int = 12,
     exclude_dirs: Optional[set[str]] = None,
+    with_outline: bool = True,
+    outline_cache: Optional[Path] = None,
+    use_ignore_files: bool = True,
+    listing: Optional[FileListing] = None,
 ) -> ProjectIndex:
     root = Path(project_root).resolve()
     exclude = exclude_dirs or set(DEFAULT_EXCLUDE_DIRS)
@@ -82,16 +243,22 @@ def build_index(
     file_count = 0
     total_bytes = 0
     files: List[Path] = []
+    sizes: Dict[Path, int] = {}
 
-    for p in _walk_files(root, exclude):
-        try:
-            size = p.stat().st_size
-        except Exception:
-            continue
+    if listing is not None:
+        stats = listing.skipped
+        entries: Iterable[Tuple[Path, int]] = listing.entries
+    else:
+        stats = WalkStats()
+        entries = iter_sized_files(root, exclude, stats, use_ignore_files)
 
+    tree = DirTree(root)
+    for p, size in entries:
         file_count += 1
         total_bytes += size
         files.append(p)
+        sizes[p] = size
+        tree.add(p, size)
 
         if file_count >= max_files or total_bytes >= max_total_bytes:
             break
@@ -117,8 +284,8 @@ def build_index(
             important_paths.append(p)
 
     # 3) fallback: smallest few text files (often configs)
-    text_files = [p for p in files if p.is_file() and _is_probably_text(p)]
-    text_files.sort(key=lambda x: x.stat().st_size if x.exists() else 10**12)
+    text_files = [p for p in files if _is_probably_text(p, sizes[p])]
+    text_files.sort(key=lambda x: sizes[x])
     for p in text_files:
         if len(important_paths) >= important_limit:
             break
@@ -134,7 +301,9 @@ def build_index(
         snippet = _safe_read_text(p, max_snippet_chars) if _is_probably_text(p) else ""
         important.append(IndexedFile(path=str(p.relative_to(root)), size=size, snippet=snippet))
 
-    tree_preview = _make_tree_preview(root, files, max_lines=120)
+    tree_preview = tree.render(max_lines=120)
+
+    outline = build_outline(root, files, cache_path=outline_cache) if with_outline else []
 
     return ProjectIndex(
         root=str(root),
@@ -142,18 +311,6 @@ def build_index(
         total_bytes=total_bytes,
         important=important,
         tree_preview=tree_preview,
+        outline=outline,
+        skipped=stats,
     )
-
-
-def _make_tree_preview(root: Path, files: List[Path], max_lines: int = 120) -> str:
-    rels = []
-    for p in files:
-        try:
-            rels.append(str(p.relative_to(root)))
-        except Exception:
-            continue
-    rels.sort()
-    lines = rels[:max_lines]
-    if len(rels) > max_lines:
-        lines.append(f"... ({len(rels) - max_lines} more)")
-    return "\n".join(lines)
@@ -0,0 +1,300 @@
+﻿from __future__ import annotations
+
+import ast
+import hashlib
+import json
+import multiprocessing
+import sys
+import threading
+import types
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from lokal_agent.core.fileio import atomic_write_bytes
+
+
+# Unterhalb dieser Anzahl ungecachter Dateien lohnt sich der Pool nicht.
+POOL_MIN_FILES = 32
+POOL_CHUNK = 16
+MAX_OUTLINE_FILE_BYTES = 1_000_000
+
+
+@dataclass
+class ClassOutline:
+    name: str
+    lineno: int
+    bases: List[str] = field(default_factory=list)
+    methods: List[str] = field(default_factory=list)
+
+
+@dataclass
+class ModuleOutline:
+    path: str
+    imports: List[str] = field(default_factory=list)
+    classes: List[ClassOutline] = field(default_factory=list)
+    functions: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, path: str, data: dict) -> "ModuleOutline":
+        return cls(
+            path=path,
+            imports=list(data.get("imports", [])),
+            classes=[ClassOutline(**c) for c in data.get("classes", [])],
+            functions=list(data.get("functions", [])),
+            error=data.get("error"),
+        )
+
+
+def parse_outline(source: bytes, path: str = "") -> ModuleOutline:
+    out = ModuleOutline(path=path)
+    try:
+        tree = ast.parse(source, filename=path or "<unknown>")
+    except (SyntaxError, ValueError) as e:
+        out.error = f"{type(e).__name__}: {e}"
+        return out
+
+    imports: Dict[str, None] = {}  # geordnet + dedupliziert
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for a in node.names:
+                imports[a.name] = None
+        elif isinstance(node, ast.ImportFrom):
+            mod = "." * node.level + (node.module or "")
+            imports[mod] = None
+    out.imports = list(imports)
+
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            out.functions.append(node.name)
+        elif isinstance(node, ast.ClassDef):
+            out.classes.append(
+                ClassOutline(
+                    name=node.name,
+                    lineno=node.lineno,
+                    bases=[ast.unparse(b) for b in node.bases],
+                    methods=[
+                        n.name for n in node.body
+                        if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))
+                    ],
+                )
+            )
+    return out
+
+
+def _parse_file(args: Tuple[str, str]) -> Tuple[str, dict]:
+    """Worker (Top-Level, damit picklebar): (abs_path, rel_path) -> (rel_path, outline-dict)."""
+    abs_path, rel_path = args
+    try:
+        source = Path(abs_path).read_bytes()
+    except OSError as e:
+        return rel_path, asdict(ModuleOutline(path=rel_path, error=str(e)))
+    return rel_path, asdict(parse_outline(source, rel_path))
+
+
+def _parse_files(batch: List[Tuple[str, str]]) -> List[Tuple[str, dict]]:
+    """Worker: mehrere Dateien pro Aufruf, spart IPC-Roundtrips."""
+    return [_parse_file(job) for job in batch]
+
+
+class OutlineCache:
+    """
+    Outline-Cache pro Datei-Inhalt (sha1). Unveränderte Dateien werden nie neu geparst,
+    auch nicht nach Umbenennen/Verschieben. Zusätzlich merkt er sich (Größe, mtime_ns) -> sha1
+    pro Pfad: unveränderte Dateien werden dann nicht einmal gelesen.
+    """
+
+    VERSION = 2
+
+    def __init__(self, path: Optional[Path]) -> None:
+        self.path = path
+        self._entries: Dict[str, dict] = {}
+        self._files: Dict[str, list] = {}  # rel -> [size, mtime_ns, sha1]
+        self._dirty = False
+        if path is not None and path.exists():
+            try:
+                doc = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                doc = {}
+            if doc.get("v") == self.VERSION:
+                self._entries = doc.get("outlines", {})
+                self._files = doc.get("files", {})
+            # ältere Cache-Dateien (nur Outlines, ohne Stat-Index) werden einfach neu aufgebaut
+
+    def get(self, digest: str) -> Optional[dict]:
+        return self._entries.get(digest)
+
+    def put(self, digest: str, data: dict) -> None:
+        self._entries[digest] = data
+        self._dirty = True
+
+    def digest_for(self, rel: str, size: int, mtime_ns: int) -> Optional[str]:
+        """sha1 aus dem letzten Lauf, falls Größe und mtime unverändert sind."""
+        known = self._files.get(rel)
+        if known is not None and known[0] == size and known[1] == mtime_ns:
+            return known[2]
+        return None
+
+    def remember(self, rel: str, size: int, mtime_ns: int, digest: str) -> None:
+        if self._files.get(rel) != [size, mtime_ns, digest]:
+            self._files[rel] = [size, mtime_ns, digest]
+            self._dirty = True
+
+    def prune(self, live: Iterable[str], live_files: Iterable[str] = ()) -> None:
+        keep = set(live)
+        stale = [k for k in self._entries if k not in keep]
+        for k in stale:
+            del self._entries[k]
+        keep_files = set(live_files)
+        stale_files = [k for k in self._files if k not in keep_files]
+        for k in stale_files:
+            del self._files[k]
+        self._dirty = self._dirty or bool(stale) or bool(stale_files)
+
+    def save(self) -> None:
+        """Best-effort: parallele Runs schreiben je eine eigene Temp-Datei; ein Fehlschlag kostet nur Cache-Treffer."""
+        if self.path is None or not self._dirty:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            doc = {"v": self.VERSION, "outlines": self._entries, "files": self._files}
+            data = json.dumps(doc, separators=(",", ":")).encode("utf-8")
+            atomic_write_bytes(self.path, data)
+        except OSError:
+            return
+        self._dirty = False
+
+
+def _digest(path: Path) -> Optional[str]:
+    try:
+        return hashlib.sha1(path.read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+# Ein Pool pro Prozess, erst bei Bedarf gestartet. "spawn" statt fork: die App hat Threads
+# (uvicorn, Watcher), ein fork würde deren Locks im Zwischenzustand kopieren.
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+@contextmanager
+def _bare_main() -> Iterator[None]:
+    """
+    Startet Worker ohne das Hauptmodul: multiprocessing würde sonst z.B. `lokal_agent.ui.app`
+    als `__mp_main__` in jedem Worker erneut ausführen (init_db, Watcher, NiceGUI).
+    Die Worker brauchen nur dieses Modul (`_parse_files`). Aufrufer hält `_pool_lock`.
+    """
+    main = sys.modules.get("__main__")
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        yield
+    finally:
+        if main is not None:
+            sys.modules["__main__"] = main
+
+
+def _parse_in_pool(jobs: List[Tuple[str, str]], max_workers: Optional[int]) -> Optional[List[Tuple[str, dict]]]:
+    """Parst im Prozess-Pool; None, wenn der Pool nicht nutzbar ist (Aufrufer parst dann selbst)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+        pool = _pool
+        # Worker werden beim Einreichen gestartet -> nur das Einreichen braucht _bare_main
+        try:
+            with _bare_main():
+                futures = [
+                    pool.submit(_parse_files, jobs[i:i + POOL_CHUNK]) for i in range(0, len(jobs), POOL_CHUNK)
+                ]
+        except (BrokenProcessPool, RuntimeError, OSError):
+            _pool = None
+            return None
+    try:
+        return [r for f in futures for r in f.result()]
+    except BrokenProcessPool:
+        with _pool_lock:
+            if _pool is pool:
+                _pool = None
+        return None
+
+
+def build_outline(
+    root: Path,
+    files: Iterable[Path],
+    *,
+    cache_path: Optional[Path] = None,
+    max_workers: Optional[int] = None,
+) -> List[ModuleOutline]:
+    """Outline aller `.py`-Dateien; Cache-Misses werden in einem Prozess-Pool geparst."""
+    cache = OutlineCache(cache_path)
+
+    entries: List[Tuple[str, Optional[str]]] = []  # (rel_path, digest)
+    misses: Dict[str, Tuple[str, str]] = {}  # digest -> (abs, rel)
+    for p in files:
+        if p.suffix != ".py":
+            continue
+        try:
+            st = p.stat()
+            if st.st_size > MAX_OUTLINE_FILE_BYTES:
+                continue
+            rel = p.relative_to(root).as_posix()
+        except (OSError, ValueError):
+            continue
+        # Nur lesen + hashen, wenn Größe/mtime sich seit dem letzten Lauf geändert haben
+        digest = cache.digest_for(rel, st.st_size, st.st_mtime_ns)
+        if digest is None or cache.get(digest) is None:
+            digest = _digest(p)
+            if digest is not None:
+                cache.remember(rel, st.st_size, st.st_mtime_ns, digest)
+        entries.append((rel, digest))
+        if digest is not None and cache.get(digest) is None and digest not in misses:
+            misses[digest] = (str(p), rel)
+
+    if misses:
+        jobs = list(misses.items())
+        results = None
+        if len(jobs) >= POOL_MIN_FILES:
+            results = _parse_in_pool([j for _, j in jobs], max_workers)
+        if results is None:
+            results = [_parse_file(j) for _, j in jobs]
+        for (digest, _), (_, data) in zip(jobs, results):
+            cache.put(digest, data)
+
+    cache.prune((d for _, d in entries if d is not None), (rel for rel, _ in entries))
+    cache.save()
+
+    outline: List[ModuleOutline] = []
+    for rel, digest in sorted(entries):
+        data = cache.get(digest) if digest is not None else None
+        if data is None:
+            continue
+        outline.append(ModuleOutline.from_dict(rel, data))
+    return outline
+
+
+def render_outline(outline: List[ModuleOutline], max_lines: int = 200) -> str:
+    """Kompakte Textform: eine Zeile pro Modul, eingerückte Zeilen pro Klasse."""
+    lines: List[str] = []
+    for m in outline:
+        if len(lines) >= max_lines:
+            lines.append(f"... ({len(outline)} Module insgesamt)")
+            break
+        head = m.path
+        if m.error:
+            lines.append(f"{head}  !! {m.error}")
+            continue
+        if m.functions:
+            head += "  def " + ", ".join(m.functions)
+        lines.append(head)
+        for c in m.classes:
+            bases = f"({', '.join(c.bases)})" if c.bases else ""
+            methods = ": " + ", ".join(c.methods) if c.methods else ""
+            lines.append(f"  class {c.name}{bases}{methods}")
+        if m.imports:
+            lines.append("  imports " + ", ".join(m.imports))
+    return "\n".join(lines)
@@ -0,0 +1,202 @@
+﻿from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from lokal_agent.core.config import AppConfig
+from lokal_agent.core.indexing.indexer import ProjectIndex, WalkStats
+
+
+# Layout (little endian):
+#   HEADER | SECTIONS | RECORDS (fixed width) | BLOB (utf-8: Root, Tree, Outline-Text, JSON, Pfade, Snippets)
+# Alle Offsets sind absolut (ab Dateianfang), damit Leser direkt auf der mmap arbeiten.
+MAGIC = b"LGAIDX01"
+VERSION = 2
+HEADER = struct.Struct("<8sIIdQQ")  # magic, version, n_records, created_at, file_count, total_bytes
+SECTIONS = struct.Struct("<QIQIQIQI")  # root, tree_preview, outline_text, skipped_json (off, len)
+RECORD = struct.Struct("<QIQQI")  # path_off, path_len, size, snippet_off, snippet_len
+SUFFIX = ".lidx"
+
+
+def snapshot_dir(cfg: AppConfig) -> Path:
+    return cfg.data_dir / "index"
+
+
+def _project_key(project_path: str) -> str:
+    return hashlib.sha1(str(Path(project_path).resolve()).encode("utf-8")).hexdigest()[:16]
+
+
+def write_snapshot(cfg: AppConfig, project_path: str, idx: ProjectIndex) -> Path:
+    """
+    Schreibt eine neue Snapshot-Generation `<key>-<ns>.lidx` (tmp + replace).
+    Es wird nie eine Datei überschrieben, die ein anderer Prozess gerade gemappt hat
+    (unter Windows wäre das nicht erlaubt); alte Generationen werden best-effort entfernt.
+    """
+    blob = bytearray()
+    base = HEADER.size + SECTIONS.size + RECORD.size * len(idx.important)
+
+    def put(data: bytes) -> tuple[int, int]:
+        off = base + len(blob)
+        blob.extend(data)
+        return off, len(data)
+
+    root = put(idx.root.encode("utf-8"))
+    tree = put(idx.tree_preview.encode("utf-8"))
+    outline = put(idx.outline_text.encode("utf-8"))  # gerendert: Leser brauchen keine Outline-Objekte
+    skipped = put(json.dumps(asdict(idx.skipped)).encode("utf-8"))
+
+    records = bytearray()
+    for f in idx.important:
+        p_off, p_len = put(f.path.encode("utf-8"))
+        s_off, s_len = put(f.snippet.encode("utf-8"))
+        records.extend(RECORD.pack(p_off, p_len, f.size, s_off, s_len))
+
+    header = HEADER.pack(MAGIC, VERSION, len(idx.important), time.time(), idx.file_count, idx.total_bytes)
+    sections = SECTIONS.pack(*root, *tree, *outline, *skipped)
+
+    out_dir = snapshot_dir(cfg)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    key = _project_key(project_path)
+    target = out_dir / f"{key}-{time.time_ns():020d}{SUFFIX}"
+    tmp = target.with_name(target.name + ".tmp")
+    with tmp.open("wb") as fh:
+        fh.write(header)
+        fh.write(sections)
+        fh.write(records)
+        fh.write(blob)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, target)
+
+    for old in out_dir.glob(f"{key}-*{SUFFIX}"):
+        if old.name < target.name:
+            try:
+                old.unlink()
+            except OSError:
+                pass  # noch gemappt (Windows) -> beim nächsten Mal
+    return target
+
+
+class IndexSnapshot:
+    """Read-only, memory-mapped Sicht auf einen Snapshot; Felder werden erst beim Zugriff dekodiert."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        with path.open("rb") as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buf = memoryview(self._mm)
+
+        magic, version, self.n_records, self.created_at, self.file_count, self.total_bytes = \
+            HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"not an index snapshot (v{VERSION}): {path}")
+        sec = SECTIONS.unpack_from(self._buf, HEADER.size)
+        self._root, self._tree, self._outline, self._skipped = (
+            (sec[0], sec[1]), (sec[2], sec[3]), (sec[4], sec[5]), (sec[6], sec[7])
+        )
+        self._records_off = HEADER.size + SECTIONS.size
+
+    def _str(self, ref: tuple[int, int]) -> str:
+        off, ln = ref
+        return str(self._buf[off:off + ln], "utf-8")
+
+    @property
+    def root(self) -> str:
+        return self._str(self._root)
+
+    @property
+    def tree_preview(self) -> str:
+        return self._str(self._tree)
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.created_at
+
+    def __len__(self) -> int:
+        return self.n_records
+
+    @property
+    def outline_text(self) -> str:
+        return self._str(self._outline)
+
+    @property
+    def skipped(self) -> WalkStats:
+        return WalkStats(**json.loads(self._str(self._skipped)))
+
+    @property
+    def important(self) -> "SnapshotFiles":
+        return SnapshotFiles(self)
+
+    def record(self, i: int) -> "SnapshotFile":
+        if not 0 <= i < self.n_records:
+            raise IndexError(i)
+        return SnapshotFile(self, *RECORD.unpack_from(self._buf, self._records_off + i * RECORD.size))
+
+
+class SnapshotFile:
+    """Ein Record des Snapshots; `path`/`snippet` werden erst beim Zugriff aus der mmap dekodiert."""
+
+    __slots__ = ("_snap", "_path", "size", "_snippet")
+
+    def __init__(self, snap: IndexSnapshot, p_off: int, p_len: int, size: int, s_off: int, s_len: int) -> None:
+        self._snap = snap
+        self._path = (p_off, p_len)
+        self.size = size
+        self._snippet = (s_off, s_len)
+
+    @property
+    def path(self) -> str:
+        return self._snap._str(self._path)
+
+    @property
+    def snippet(self) -> str:
+        return self._snap._str(self._snippet)
+
+
+class SnapshotFiles:
+    """Sequenz-Sicht auf die Records (wie `ProjectIndex.important`), ohne sie vorab zu materialisieren."""
+
+    def __init__(self, snap: IndexSnapshot) -> None:
+        self._snap = snap
+
+    def __len__(self) -> int:
+        return self._snap.n_records
+
+    def __getitem__(self, i: int) -> SnapshotFile:
+        return self._snap.record(i)
+
+    def __iter__(self) -> Iterator[SnapshotFile]:
+        for i in range(self._snap.n_records):
+            yield self._snap.record(i)
+
+
+# Pro Prozess: zuletzt gemappte Generation je Projekt (neue Generation -> neu mappen).
+_mapped: Dict[str, IndexSnapshot] = {}
+_mapped_lock = threading.Lock()
+
+
+def open_snapshot(cfg: AppConfig, project_path: str) -> Optional[IndexSnapshot]:
+    key = _project_key(project_path)
+    candidates: List[Path] = sorted(snapshot_dir(cfg).glob(f"{key}-*{SUFFIX}"))
+    if not candidates:
+        return None
+    latest = candidates[-1]
+
+    with _mapped_lock:
+        snap = _mapped.get(key)
+        if snap is not None and snap.path == latest:
+            return snap
+        try:
+            snap = IndexSnapshot(latest)
+        except (OSError, ValueError, struct.error):
+            return None
+        _mapped[key] = snap
+        return snap
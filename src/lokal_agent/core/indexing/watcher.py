@@ -0,0 +1,328 @@
+﻿from __future__ import annotations
+
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+from lokal_agent.core.config import AppConfig
+from lokal_agent.core.indexing.ignore import IGNORE_FILENAMES, IgnoreChain, IgnoreMatcher
+from lokal_agent.core.indexing.indexer import (
+    DEFAULT_EXCLUDE_DIRS,
+    FileListing,
+    WalkStats,
+    iter_sized_files,
+)
+
+# Optional: watchdog nutzt inotify (Linux) bzw. die native API des OS.
+# Ohne watchdog fallen wir auf periodisches Re-Walken im Hintergrund zurück.
+try:
+    from watchdog.events import FileSystemEventHandler  # type: ignore
+    from watchdog.observers import Observer  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    FileSystemEventHandler = object  # type: ignore
+    Observer = None  # type: ignore
+
+
+class HotProject:
+    """Dateiliste (Pfad -> Größe) eines Projekts, aktuell gehalten über FS-Events oder Polling."""
+
+    def __init__(self, root: Path, exclude_dirs: set[str], max_files: int) -> None:
+        self.root = root
+        self.exclude_dirs = exclude_dirs
+        self.max_files = max_files
+        self.files: Dict[Path, int] = {}
+        self.skipped = WalkStats()
+        self.needs_rescan = True
+        self.too_large = False
+        self._scanning = False
+        self._scan_dirty = False
+        self.last_access = time.monotonic()
+        self.last_full_scan = 0.0
+        self.used_at: Optional[datetime] = None  # Project.last_used_at beim Aufnehmen
+        self.observer = None
+        self._dir_mtimes: Dict[str, int] = {}  # Polling: Ordner -> st_mtime_ns beim letzten Walk
+        self._matchers: Dict[Path, Optional[IgnoreMatcher]] = {}
+        self._lock = threading.Lock()
+
+    # ---- Zustand ----
+    def rescan(self) -> None:
+        with self._lock:
+            self._scanning = True
+            self._scan_dirty = False
+        stats = WalkStats()
+        files: Dict[Path, int] = {}
+        dirs: list[str] = []
+        for p, size in iter_sized_files(self.root, self.exclude_dirs, stats, dirs_out=dirs):
+            files[p] = size
+            if len(files) > self.max_files:
+                break
+        dir_mtimes: Dict[str, int] = {}
+        for d in dirs:
+            try:
+                dir_mtimes[d] = os.stat(d).st_mtime_ns
+            except OSError:
+                continue
+        with self._lock:
+            self._dir_mtimes = dir_mtimes
+            self.last_full_scan = time.monotonic()
+            self.too_large = len(files) > self.max_files
+            self.files = {} if self.too_large else files
+            self.skipped = stats
+            self._matchers.clear()
+            # Events während des Walks sind evtl. nicht enthalten -> nochmal
+            self.needs_rescan = self._scan_dirty and not self.too_large
+            self._scanning = False
+
+    def dirs_changed(self) -> bool:
+        """
+        Günstiger Polling-Check: ein stat pro Ordner statt eines Walks. Anlegen/Löschen/Umbenennen
+        ändert die mtime des Ordners; reine Inhaltsänderungen fängt erst der periodische Voll-Scan.
+        """
+        for d, mtime in list(self._dir_mtimes.items()):
+            try:
+                if os.stat(d).st_mtime_ns != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def snapshot(self) -> Optional[FileListing]:
+        with self._lock:
+            self.last_access = time.monotonic()
+            if self.needs_rescan or self.too_large:
+                return None
+            return FileListing(entries=list(self.files.items()), skipped=self.skipped)
+
+    # ---- Events ----
+    def _matcher(self, directory: Path) -> Optional[IgnoreMatcher]:
+        if directory not in self._matchers:
+            self._matchers[directory] = IgnoreMatcher.from_dir(directory)
+        return self._matchers[directory]
+
+    def _is_excluded(self, path: Path, is_dir: bool) -> bool:
+        try:
+            parts = path.relative_to(self.root).parts
+        except ValueError:
+            return True
+        if not parts:
+            return False
+        chain = IgnoreChain().extend(self._matcher(self.root))
+        cur = self.root
+        for part in parts[:-1]:
+            if part in self.exclude_dirs or chain.is_ignored(part, is_dir=True):
+                return True
+            cur = cur / part
+            chain = chain.descend(part).extend(self._matcher(cur))
+        last = parts[-1]
+        if is_dir and last in self.exclude_dirs:
+            return True
+        return chain.is_ignored(last, is_dir=is_dir)
+
+    def apply_event(self, kind: str, src: str, is_dir: bool, dest: Optional[str] = None) -> None:
+        with self._lock:
+            if self._scanning:
+                self._scan_dirty = True
+                return
+            if self.needs_rescan or self.too_large:
+                return
+            src_p = Path(src)
+            if src_p.name in IGNORE_FILENAMES or (dest and Path(dest).name in IGNORE_FILENAMES):
+                # Regeln haben sich geändert -> ignorierte Menge neu bestimmen
+                self.needs_rescan = True
+                return
+
+            if kind == "moved" and dest:
+                self._remove(src_p, is_dir)
+                self._add(Path(dest), is_dir)
+            elif kind == "deleted":
+                self._remove(src_p, is_dir)
+            elif kind == "created" or (kind == "modified" and not is_dir):
+                # DirModifiedEvent (Eltern-Ordner bei jedem Datei-Event) trägt keine eigene Information
+                self._add(src_p, is_dir)
+
+    def _remove(self, path: Path, is_dir: bool) -> None:
+        if not is_dir:
+            self.files.pop(path, None)
+            return
+        for p in [p for p in self.files if path in p.parents]:
+            del self.files[p]
+
+    def _add(self, path: Path, is_dir: bool) -> None:
+        if is_dir:
+            # Neue/verschobene Ordner: Inhalt kennt nur ein Walk
+            if not self._is_excluded(path, is_dir=True):
+                self.needs_rescan = True
+            return
+        if self._is_excluded(path, is_dir=False):
+            return
+        try:
+            self.files[path] = path.stat().st_size
+        except OSError:
+            self.files.pop(path, None)
+            return
+        if len(self.files) > self.max_files:
+            self.too_large = True
+            self.files = {}
+
+
+class _EventHandler(FileSystemEventHandler):  # type: ignore[misc]
+    def __init__(self, project: HotProject) -> None:
+        super().__init__()
+        self.project = project
+
+    def on_any_event(self, event) -> None:
+        self.project.apply_event(
+            event.event_type,
+            event.src_path,
+            event.is_directory,
+            getattr(event, "dest_path", None),
+        )
+
+
+class IndexWatcherService:
+    """
+    Hält die Dateilisten der zuletzt benutzten Projekte (Project.last_used_at) im Speicher aktuell,
+    damit `build_index` ohne Walk auskommt. Idle Projekte und Projekte über dem Speicherlimit
+    werden verdrängt (LRU nach letztem Zugriff).
+    """
+
+    def __init__(
+        self,
+        cfg: AppConfig,
+        *,
+        max_projects: int = 8,
+        max_files_per_project: int = 200_000,
+        max_total_files: int = 500_000,
+        idle_seconds: float = 1800.0,
+        poll_interval: float = 5.0,
+        full_rescan_interval: float = 300.0,
+        use_native: bool = True,
+    ) -> None:
+        self.cfg = cfg
+        self.max_projects = max_projects
+        self.max_files_per_project = max_files_per_project
+        self.max_total_files = max_total_files
+        self.idle_seconds = idle_seconds
+        self.poll_interval = poll_interval
+        self.full_rescan_interval = full_rescan_interval
+        self.use_native = use_native and Observer is not None
+        self.projects: Dict[Path, HotProject] = {}
+        self._rejected: set[Path] = set()  # zu groß -> nicht erneut beobachten
+        # wegen Gesamtlimit verdrängt -> erst wieder aufnehmen, wenn das Projekt erneut benutzt wird
+        self._displaced: Dict[Path, Optional[datetime]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---- Lifecycle ----
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="index-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 1)
+            self._thread = None
+        with self._lock:
+            for root in list(self.projects):
+                self._evict(root)
+
+    # ---- Public ----
+    def snapshot(self, project_path: str) -> Optional[FileListing]:
+        root = Path(project_path).resolve()
+        with self._lock:
+            proj = self.projects.get(root)
+        return proj.snapshot() if proj is not None else None
+
+    def watch(self, project_path: str, used_at: Optional[datetime] = None) -> None:
+        """`used_at` (Project.last_used_at) kommt vom DB-Abgleich; explizite Aufrufe ohne ihn gelten immer."""
+        root = Path(project_path).resolve()
+        with self._lock:
+            if root in self.projects or root in self._rejected or not root.is_dir():
+                return
+            if used_at is not None and root in self._displaced and self._displaced[root] == used_at:
+                return  # seit der Verdrängung nicht benutzt -> nicht erneut komplett walken
+            self._displaced.pop(root, None)
+            proj = HotProject(root, set(DEFAULT_EXCLUDE_DIRS), self.max_files_per_project)
+            proj.used_at = used_at
+            if self.use_native:
+                obs = Observer()
+                obs.schedule(_EventHandler(proj), str(root), recursive=True)
+                obs.daemon = True
+                obs.start()
+                proj.observer = obs
+            self.projects[root] = proj
+
+    # ---- Intern ----
+    def _evict(self, root: Path) -> None:
+        proj = self.projects.pop(root, None)
+        if proj is not None and proj.observer is not None:
+            proj.observer.stop()
+
+    def _sync_projects(self) -> None:
+        try:
+            from lokal_agent.core.storage.db import list_projects
+            recent = list_projects(self.cfg, limit=self.max_projects)
+        except Exception:
+            recent = []
+        now = datetime.utcnow()
+        for p in recent:
+            if p.last_used_at and (now - p.last_used_at).total_seconds() <= self.idle_seconds:
+                self.watch(p.path, used_at=p.last_used_at)
+
+    def _enforce_limits(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for root, proj in list(self.projects.items()):
+                if proj.too_large:
+                    self._rejected.add(root)
+                    self._evict(root)
+                elif now - proj.last_access > self.idle_seconds:
+                    self._evict(root)
+
+            by_age = sorted(self.projects.items(), key=lambda kv: kv[1].last_access)
+            total = sum(len(p.files) for p in self.projects.values())
+            while by_age and (len(self.projects) > self.max_projects or total > self.max_total_files):
+                root, proj = by_age.pop(0)
+                total -= len(proj.files)
+                self._displaced[root] = proj.used_at
+                self._evict(root)
+
+    def _poll_due(self, proj: HotProject) -> bool:
+        if time.monotonic() - proj.last_full_scan >= self.full_rescan_interval:
+            return True
+        return proj.dirs_changed()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self._sync_projects()
+            with self._lock:
+                projects = list(self.projects.values())
+            for proj in projects:
+                if self._stop.is_set():
+                    break
+                if proj.needs_rescan or (not self.use_native and self._poll_due(proj)):
+                    proj.rescan()
+            self._enforce_limits()
+            self._stop.wait(self.poll_interval)
+
+
+_service: Optional[IndexWatcherService] = None
+
+
+def start_index_watcher(cfg: AppConfig, **kwargs) -> IndexWatcherService:
+    global _service
+    if _service is None:
+        _service = IndexWatcherService(cfg, **kwargs)
+        _service.start()
+    return _service
+
+
+def get_index_watcher() -> Optional[IndexWatcherService]:
+    return _service
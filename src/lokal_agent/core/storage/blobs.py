@@ -0,0 +1,132 @@
+﻿from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+import zlib
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Set
+
+from lokal_agent.core.config import AppConfig
+from lokal_agent.core.fileio import atomic_write_bytes
+
+
+CAS_PREFIX = "cas:"
+MANIFEST_VERSION = 1
+
+
+class BlobStore:
+    """
+    Content-addressed Ablage: `blobs/<sha256[:2]>/<sha256[2:]>`, Inhalt zlib-komprimiert.
+    Gleicher Inhalt -> gleicher Name -> wird nur einmal geschrieben (über Runs und Projekte hinweg).
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+
+    @classmethod
+    def for_config(cls, cfg: AppConfig) -> "BlobStore":
+        return cls(cfg.data_dir / "blobs")
+
+    def path_for(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:]
+
+    def exists(self, digest: str) -> bool:
+        return self.path_for(digest).exists()
+
+    def put(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest)
+        if path.exists():
+            # dedupliziert: kein Schreib-I/O, nur mtime auffrischen (Schutz vor gc während laufender Runs)
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            return digest
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # gleicher Inhalt aus mehreren Threads gleichzeitig: wer zuerst ersetzt, gewinnt
+        atomic_write_bytes(path, zlib.compress(data, 6), identical_ok=True)
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        return zlib.decompress(self.path_for(digest).read_bytes())
+
+    def iter_digests(self) -> Iterator[str]:
+        if not self.root.exists():
+            return
+        for sub in self.root.iterdir():
+            if not sub.is_dir():
+                continue
+            for p in sub.iterdir():
+                if not p.name.endswith(".tmp"):
+                    yield sub.name + p.name
+
+    # ---- Manifeste (Artefakt aus mehreren Chunks) ----
+    def put_manifest(self, kind: str, chunks: List[str], size: int, media_type: str = "text/markdown") -> str:
+        doc = {"v": MANIFEST_VERSION, "kind": kind, "media_type": media_type, "size": size, "chunks": chunks}
+        return self.put(json.dumps(doc, separators=(",", ":"), sort_keys=True).encode("utf-8"))
+
+    def get_manifest(self, digest: str) -> dict:
+        return json.loads(self.get(digest))
+
+    def read_artifact(self, digest: str) -> bytes:
+        return b"".join(self.get(c) for c in self.get_manifest(digest)["chunks"])
+
+    def gc(self, live_manifests: Iterable[str], min_age_s: float = 3600.0) -> int:
+        """
+        Löscht Blobs, die von keinem lebenden Manifest erreicht werden und älter als min_age_s sind
+        (Chunks laufender Runs haben noch kein Manifest). Gibt die Anzahl zurück.
+        """
+        live: Set[str] = set()
+        for m in live_manifests:
+            live.add(m)
+            try:
+                live.update(self.get_manifest(m)["chunks"])
+            except (OSError, ValueError, KeyError, zlib.error):
+                continue
+        cutoff = time.time() - min_age_s
+        removed = 0
+        for digest in list(self.iter_digests()):
+            if digest in live:
+                continue
+            path = self.path_for(digest)
+            try:
+                if path.stat().st_mtime > cutoff:
+                    continue
+                path.unlink()
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+
+class ChunkedArtifactWriter:
+    """Schreibt ein Artefakt stückweise (z.B. Report-Abschnitte) als Chunks und schließt mit einem Manifest ab."""
+
+    def __init__(self, store: BlobStore, kind: str, media_type: str = "text/markdown") -> None:
+        self.store = store
+        self.kind = kind
+        self.media_type = media_type
+        self.chunks: List[str] = []
+        self.size = 0
+        self.manifest: Optional[str] = None
+
+    def write(self, data: bytes) -> str:
+        digest = self.store.put(data)
+        self.chunks.append(digest)
+        self.size += len(data)
+        return digest
+
+    def close(self) -> str:
+        self.manifest = self.store.put_manifest(self.kind, self.chunks, self.size, self.media_type)
+        return self.manifest
+
+
+def cas_ref(digest: str) -> str:
+    return CAS_PREFIX + digest
+
+
+def parse_cas_ref(ref: str) -> Optional[str]:
+    return ref[len(CAS_PREFIX):] if ref.startswith(CAS_PREFIX) else None
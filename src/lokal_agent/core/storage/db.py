@@ -1,25 +1,49 @@
 ﻿from __future__ import annotations
 
+import base64
+import json
 from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Iterable, Optional
+from typing import Iterable, Iterator, Optional, Tuple
 
+from sqlalchemy import event, tuple_
 from sqlmodel import SQLModel, Session, create_engine, select
 
 from lokal_agent.core.config import AppConfig, ensure_dirs
 from lokal_agent.core.storage.models import Project, Run, Message, Artifact
 
 
+_engines: dict[str, object] = {}
+
+
 def make_engine(cfg: AppConfig):
-    ensure_dirs(cfg)
     db_url = f"sqlite:///{cfg.db_path.as_posix()}"
-    return create_engine(db_url, echo=False)
+    engine = _engines.get(db_url)
+    if engine is None:
+        ensure_dirs(cfg)
+        engine = _engines[db_url] = create_engine(db_url, echo=False)
+        event.listen(engine, "connect", _sqlite_pragmas)
+    return engine
+
+
+def _sqlite_pragmas(dbapi_conn, _record) -> None:
+    cur = dbapi_conn.cursor()
+    # muss VOR journal_mode=WAL laufen: der Moduswechsel legt die DB-Datei an, danach ist
+    # auto_vacuum fest. Bestehende DBs einmalig per retention.convert_to_incremental_vacuum() umstellen.
+    cur.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    # WAL: Leser und Hintergrund-Jobs (Retention) blockieren Schreiber nicht
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.close()
 
 
 def init_db(cfg: AppConfig) -> None:
     engine = make_engine(cfg)
     SQLModel.metadata.create_all(engine)
+    # create_all legt Indizes nur für neue Tabellen an -> bestehende DBs nachziehen
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
 
 
 @contextmanager
@@ -86,6 +110,19 @@ def list_messages(cfg: AppConfig, run_id: int) -> list[Message]:
         return msgs
 
 
+def iter_message_rows(cfg: AppConfig, run_id: int, batch_size: int = 1000) -> Iterator[dict]:
+    """Messages als schlanke dicts, serverseitig in Batches gelesen (keine ORM-Objekte, keine Gesamtliste)."""
+    q = (
+        select(Message.role, Message.content, Message.ts)
+        .where(Message.run_id == run_id)
+        .order_by(Message.ts)
+        .execution_options(yield_per=batch_size)
+    )
+    with session_scope(cfg) as s:
+        for role, content, ts in s.exec(q):
+            yield {"role": role, "content": content, "ts": ts}
+
+
 def add_artifact(cfg: AppConfig, run_id: int, path: str, type_: str, description: str) -> None:
     with session_scope(cfg) as s:
         a = Artifact(run_id=run_id, path=path, type=type_, description=description)
@@ -93,32 +130,120 @@ def add_artifact(cfg: AppConfig, run_id: int, path: str, type_: str, description
         s.commit()
 
 
+def list_artifacts(cfg: AppConfig, run_id: int, type_: Optional[str] = None) -> list[Artifact]:
+    with session_scope(cfg) as s:
+        q = select(Artifact).where(Artifact.run_id == run_id)
+        if type_ is not None:
+            q = q.where(Artifact.type == type_)
+        return list(s.exec(q.order_by(Artifact.id)))
+
+
+def live_cas_refs(cfg: AppConfig) -> list[str]:
+    with session_scope(cfg) as s:
+        return list(s.exec(select(Artifact.path).where(Artifact.path.startswith("cas:"))))
+
+
 def get_run(cfg: AppConfig, run_id: int) -> Optional[Run]:
     with session_scope(cfg) as s:
         return s.get(Run, run_id)
 
 
 def list_runs(cfg: AppConfig, limit: int = 30) -> list[Run]:
-    with session_scope(cfg) as s:
-        runs = list(s.exec(select(Run).order_by(Run.created_at.desc()).limit(limit)))
-        return runs
+    runs, _ = list_runs_page(cfg, limit=limit)
+    return runs
 
-def list_projects(cfg: AppConfig, limit: int = 20) -> list[Project]:
-    with session_scope(cfg) as s:
-        q = select(Project).order_by(Project.last_used_at.desc().nullslast(), Project.created_at.desc()).limit(limit)
-        return list(s.exec(q))
 
+def list_projects(cfg: AppConfig, limit: int = 20) -> list[Project]:
+    projects, _ = list_projects_page(cfg, limit=limit)
+    return projects
+
+
+# ------------------------
+# Keyset-Pagination
+# ------------------------
+def encode_cursor(ts: Optional[datetime], id_: int) -> str:
+    raw = json.dumps([ts.isoformat() if ts else None, id_]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    """Raises ValueError bei ungültigem Cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        ts, id_ = json.loads(raw)
+        return (datetime.fromisoformat(ts) if ts else None), int(id_)
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {cursor!r}") from e
+
+
+def list_runs_page(
+    cfg: AppConfig,
+    *,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    project_id: Optional[int] = None,
+) -> Tuple[list[Run], Optional[str]]:
+    """Neueste zuerst (created_at, id). Nutzt ix_run_*_created_at_id – kein Full Scan, kein OFFSET."""
+    q = select(Run)
+    if status:
+        q = q.where(Run.status == status)
+    if project_id is not None:
+        q = q.where(Run.project_id == project_id)
+    if cursor:
+        ts, last_id = decode_cursor(cursor)
+        q = q.where(tuple_(Run.created_at, Run.id) < (ts, last_id))
+    q = q.order_by(Run.created_at.desc(), Run.id.desc()).limit(limit + 1)
 
-def get_project_by_id(cfg: AppConfig, project_id: int) -> Optional[Project]:
     with session_scope(cfg) as s:
-        return s.get(Project, project_id)
+        runs = list(s.exec(q))
+    next_cursor = None
+    if len(runs) > limit:
+        runs = runs[:limit]
+        next_cursor = encode_cursor(runs[-1].created_at, runs[-1].id)
+    return runs, next_cursor
+
+
+def list_projects_page(
+    cfg: AppConfig,
+    *,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+) -> Tuple[list[Project], Optional[str]]:
+    """
+    Zuletzt benutzte zuerst (last_used_at, id), Projekte ohne last_used_at am Ende (nach id).
+    Zwei getrennte Seeks auf ix_project_last_used_at_id statt eines OR – das OR macht aus dem
+    SEARCH einen SCAN über alle neueren Zeilen.
+    """
+    ts: Optional[datetime] = None
+    last_id: Optional[int] = None
+    if cursor:
+        ts, last_id = decode_cursor(cursor)
+    in_null_block = cursor is not None and ts is None
 
-def list_projects(cfg: AppConfig, limit: int = 20) -> list[Project]:
     with session_scope(cfg) as s:
-        q = select(Project).order_by(Project.last_used_at.desc().nullslast(), Project.created_at.desc()).limit(limit)
-        return list(s.exec(q))
+        projects: list[Project] = []
+        if not in_null_block:
+            q = select(Project).where(Project.last_used_at.is_not(None))
+            if cursor:
+                q = q.where(tuple_(Project.last_used_at, Project.id) < (ts, last_id))
+            q = q.order_by(Project.last_used_at.desc(), Project.id.desc()).limit(limit + 1)
+            projects = list(s.exec(q))
+        if len(projects) <= limit:
+            q = select(Project).where(Project.last_used_at.is_(None))
+            if in_null_block:
+                q = q.where(Project.id < last_id)
+            q = q.order_by(Project.id.desc()).limit(limit + 1 - len(projects))
+            projects.extend(s.exec(q))
+
+    next_cursor = None
+    if len(projects) > limit:
+        projects = projects[:limit]
+        next_cursor = encode_cursor(projects[-1].last_used_at, projects[-1].id)
+    return projects, next_cursor
 
 
 def get_project_by_id(cfg: AppConfig, project_id: int) -> Optional[Project]:
     with session_scope(cfg) as s:
         return s.get(Project, project_id)
+
@@ -3,10 +3,14 @@
 from datetime import datetime
 from typing import Optional
 
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field
 
 
 class Project(SQLModel, table=True):
+    # Keyset-Pagination: ORDER BY last_used_at DESC, id DESC
+    __table_args__ = (Index("ix_project_last_used_at_id", "last_used_at", "id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str
     path: str
@@ -15,6 +19,13 @@ class Project(SQLModel, table=True):
 
 
 class Run(SQLModel, table=True):
+    # Keyset-Pagination: ORDER BY created_at DESC, id DESC (optional gefiltert nach status/project_id)
+    __table_args__ = (
+        Index("ix_run_created_at_id", "created_at", "id"),
+        Index("ix_run_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_run_project_id_created_at_id", "project_id", "created_at", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     project_id: int = Field(index=True)
     status: str = Field(default="QUEUED", index=True)  # QUEUED/RUNNING/COMPLETED/FAILED
@@ -0,0 +1,84 @@
+﻿from __future__ import annotations
+
+import gzip
+import hashlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from lokal_agent.core.config import AppConfig
+from lokal_agent.core.fileio import atomic_write_bytes
+from lokal_agent.core.storage.blobs import BlobStore, parse_cas_ref
+from lokal_agent.core.storage.db import list_artifacts
+
+
+GZIP_SUFFIX = ".gz"
+
+
+@dataclass(frozen=True)
+class ReportBlob:
+    data: bytes  # unkomprimiert (identity)
+    gz: bytes  # gzip-Variante (Content-Encoding)
+    etag: str  # starker ETag über den Inhalt
+
+    @property
+    def gz_etag(self) -> str:
+        return self.etag[:-1] + '-gz"'
+
+
+def report_url(run_id: int) -> str:
+    """Öffentliche Adresse des Reports (API); unabhängig davon, wie er gespeichert ist."""
+    return f"/runs/{run_id}/report"
+
+
+def report_path(cfg: AppConfig, run_id: int) -> Path:
+    return (cfg.reports_dir / f"run_{run_id}_report.md").resolve()
+
+
+def compressed_path(path: Path) -> Path:
+    return path.with_name(path.name + GZIP_SUFFIX)
+
+
+def _etag(data: bytes) -> str:
+    return '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+
+
+def store_compressed(path: Path) -> Path:
+    """Schreibt `<report>.gz` neben den Report (atomar, eindeutige Temp-Datei)."""
+    data = path.read_bytes()
+    gz_path = compressed_path(path)
+    # mtime=0: gleicher Inhalt -> byte-identisches gzip, parallele Erst-Zugriffe schreiben dasselbe
+    atomic_write_bytes(gz_path, gzip.compress(data, compresslevel=6, mtime=0), identical_ok=True)
+    return gz_path
+
+
+def load_report(cfg: AppConfig, run_id: int) -> Optional[ReportBlob]:
+    """
+    Lädt den Report eines Runs aus dem Blob-Store (Artefakt `cas:<manifest>`).
+    Fallback für Runs von vor dem Blob-Store: `run_<id>_report.md(.gz)`, bevorzugt komprimiert;
+    Reports ohne `.gz` werden beim ersten Zugriff nachkomprimiert.
+    """
+    for art in list_artifacts(cfg, run_id, type_="report"):
+        digest = parse_cas_ref(art.path)
+        if digest is None:
+            continue
+        try:
+            data = BlobStore.for_config(cfg).read_artifact(digest)
+        except OSError:
+            continue
+        return ReportBlob(data=data, gz=gzip.compress(data, compresslevel=6, mtime=0), etag=_etag(data))
+
+    path = report_path(cfg, run_id)
+    gz_path = compressed_path(path)
+
+    if gz_path.exists():
+        gz = gz_path.read_bytes()
+        data = gzip.decompress(gz)
+    elif path.exists():
+        store_compressed(path)
+        gz = gz_path.read_bytes()
+        data = gzip.decompress(gz)
+    else:
+        return None
+
+    return ReportBlob(data=data, gz=gz, etag=_etag(data))
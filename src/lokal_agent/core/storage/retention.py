@@ -0,0 +1,296 @@
+﻿from __future__ import annotations
+
+import io
+import json
+import tarfile
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import bindparam, delete, text
+from sqlmodel import select
+
+from lokal_agent.core.config import AppConfig
+from lokal_agent.core.fileio import atomic_open
+from lokal_agent.core.storage.blobs import BlobStore, parse_cas_ref
+from lokal_agent.core.storage.db import live_cas_refs, make_engine, session_scope
+from lokal_agent.core.storage.models import Artifact, Message, Run
+from lokal_agent.core.storage.reports import compressed_path, load_report, report_path
+
+
+FINISHED_STATUSES = ("COMPLETED", "FAILED")
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    max_age_days: Optional[int] = None
+    keep_per_project: Optional[int] = None
+    batch_size: int = 200  # Runs pro Bundle/Transaktion – hält Schreibsperren kurz
+
+    @classmethod
+    def from_config(cls, cfg: AppConfig) -> "RetentionPolicy":
+        return cls(max_age_days=cfg.retention_max_age_days, keep_per_project=cfg.retention_keep_per_project)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_age_days is not None or self.keep_per_project is not None
+
+
+@dataclass
+class RetentionResult:
+    archived_runs: List[int]
+    bundles: List[Path]
+    freed_pages: int = 0
+    removed_blobs: int = 0
+
+
+def select_expired_runs(cfg: AppConfig, policy: RetentionPolicy, now: Optional[datetime] = None) -> List[int]:
+    """IDs abgeschlossener Runs, die älter als max_age_days sind oder über keep_per_project hinausgehen."""
+    conds = []
+    params: Dict[str, object] = {}
+    if policy.max_age_days is not None:
+        conds.append("created_at < :cutoff")
+        params["cutoff"] = (now or datetime.utcnow()) - timedelta(days=policy.max_age_days)
+    if policy.keep_per_project is not None:
+        conds.append("rn > :keep")
+        params["keep"] = policy.keep_per_project
+    if not conds:
+        return []
+
+    sql = text(
+        "SELECT id FROM ("
+        "  SELECT id, status, created_at,"
+        "         ROW_NUMBER() OVER (PARTITION BY project_id ORDER BY created_at DESC, id DESC) AS rn"
+        "  FROM run"
+        ") WHERE status IN :finished AND (" + " OR ".join(conds) + ") ORDER BY id"
+    ).bindparams(bindparam("finished", expanding=True))
+    params["finished"] = list(FINISHED_STATUSES)
+
+    with make_engine(cfg).connect() as conn:
+        return [row[0] for row in conn.execute(sql, params)]
+
+
+def _to_json(obj) -> dict:
+    out = obj.model_dump()
+    for k, v in out.items():
+        if isinstance(v, datetime):
+            out[k] = v.isoformat()
+    return out
+
+
+def _report_files(cfg: AppConfig, run_id: int) -> List[Path]:
+    """Reports aus der Zeit vor dem Blob-Store."""
+    path = report_path(cfg, run_id)
+    return [p for p in (path, compressed_path(path)) if p.exists()]
+
+
+def _write_bundle(cfg: AppConfig, run_ids: List[int]) -> Path:
+    """Ein tar.gz pro Batch: runs/<id>.json (Run + Messages + Artefakte) und die Report-Dateien."""
+    cfg.archive_dir.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    target = cfg.archive_dir / f"runs_{run_ids[0]}-{run_ids[-1]}_{stamp}.tar.gz"
+
+    # eindeutige Temp-Datei, fsync auf dem Schreib-Handle, bei Fehlern aufgeräumt
+    with atomic_open(target, fsync=True) as fh, session_scope(cfg) as s, \
+            tarfile.open(fileobj=fh, mode="w:gz") as tar:
+        runs = {r.id: r for r in s.exec(select(Run).where(Run.id.in_(run_ids)))}
+        msgs: Dict[int, list] = {}
+        for m in s.exec(select(Message).where(Message.run_id.in_(run_ids)).order_by(Message.run_id, Message.ts)):
+            msgs.setdefault(m.run_id, []).append(_to_json(m))
+        arts: Dict[int, list] = {}
+        for a in s.exec(select(Artifact).where(Artifact.run_id.in_(run_ids))):
+            arts.setdefault(a.run_id, []).append(_to_json(a))
+
+        for run_id in run_ids:
+            run = runs.get(run_id)
+            if run is None:
+                continue
+            doc = {"run": _to_json(run), "messages": msgs.get(run_id, []), "artifacts": arts.get(run_id, [])}
+            data = json.dumps(doc, ensure_ascii=False).encode("utf-8")
+            info = tarfile.TarInfo(f"runs/{run_id}.json")
+            info.size = len(data)
+            info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(data))
+            report = load_report(cfg, run_id)
+            if report is not None:
+                info = tarfile.TarInfo(f"reports/run_{run_id}_report.md")
+                info.size = len(report.data)
+                info.mtime = int(time.time())
+                tar.addfile(info, io.BytesIO(report.data))
+    return target
+
+
+def _delete_runs(cfg: AppConfig, run_ids: List[int]) -> None:
+    with session_scope(cfg) as s:
+        s.exec(delete(Message).where(Message.run_id.in_(run_ids)))
+        s.exec(delete(Artifact).where(Artifact.run_id.in_(run_ids)))
+        s.exec(delete(Run).where(Run.id.in_(run_ids)))
+        s.commit()
+    for run_id in run_ids:
+        for p in _report_files(cfg, run_id):
+            try:
+                p.unlink()
+            except OSError:
+                pass
+
+
+def convert_to_incremental_vacuum(cfg: AppConfig) -> bool:
+    """
+    Einmalige Umstellung einer bestehenden DB auf auto_vacuum=INCREMENTAL (volles VACUUM).
+    Baut die ganze Datei neu und sperrt sie so lange – nur bei gestoppter UI/API ausführen:
+
+        python -m lokal_agent.core.storage.retention --convert-vacuum
+
+    Gibt False zurück, wenn die DB bereits umgestellt ist.
+    """
+    engine = make_engine(cfg)
+    with engine.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2:  # 2 = INCREMENTAL
+            return False
+        conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.exec_driver_sql("VACUUM")
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        mode = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+    if mode != 2:
+        raise RuntimeError(f"auto_vacuum conversion failed (mode={mode})")
+    return True
+
+
+def compact(cfg: AppConfig, max_pages: int = 2000, allow_full_vacuum: bool = False) -> int:
+    """
+    Gibt freie Seiten schrittweise zurück (`incremental_vacuum`), ohne die DB lange zu sperren.
+    Alte DBs ohne auto_vacuum=INCREMENTAL werden nur mit allow_full_vacuum einmalig umgestellt
+    (siehe convert_to_incremental_vacuum); sonst gibt es nichts zu tun.
+    """
+    engine = make_engine(cfg)
+    with engine.connect() as conn:
+        mode = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+    if mode != 2:  # 2 = INCREMENTAL
+        if not allow_full_vacuum:
+            return 0
+        convert_to_incremental_vacuum(cfg)
+
+    with engine.connect() as conn:
+        before = conn.exec_driver_sql("PRAGMA freelist_count").scalar() or 0
+        # sqlite3.execute() macht nur einen Schritt (= eine Seite); executescript läuft bis zum Ende
+        conn.connection.driver_connection.executescript(f"PRAGMA incremental_vacuum({int(max_pages)});")
+        after = conn.exec_driver_sql("PRAGMA freelist_count").scalar() or 0
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.commit()
+    return max(before - after, 0)
+
+
+def apply_retention(
+    cfg: AppConfig,
+    policy: Optional[RetentionPolicy] = None,
+    *,
+    now: Optional[datetime] = None,
+    on_archived: Optional[Callable[[List[int]], None]] = None,
+) -> RetentionResult:
+    policy = policy or RetentionPolicy.from_config(cfg)
+    result = RetentionResult(archived_runs=[], bundles=[])
+    if not policy.enabled:
+        return result
+
+    expired = select_expired_runs(cfg, policy, now)
+    for i in range(0, len(expired), policy.batch_size):
+        batch = expired[i:i + policy.batch_size]
+        result.bundles.append(_write_bundle(cfg, batch))
+        _delete_runs(cfg, batch)
+        result.archived_runs.extend(batch)
+        if on_archived is not None:
+            on_archived(batch)
+
+    if result.archived_runs:
+        # Blobs, die nur von archivierten Runs referenziert wurden, freigeben
+        live = [d for d in (parse_cas_ref(ref) for ref in live_cas_refs(cfg)) if d]
+        result.removed_blobs = BlobStore.for_config(cfg).gc(live)
+        result.freed_pages = compact(cfg)
+    return result
+
+
+class RetentionScheduler:
+    """Führt apply_retention periodisch in einem Daemon-Thread aus."""
+
+    def __init__(
+        self,
+        cfg: AppConfig,
+        policy: Optional[RetentionPolicy] = None,
+        on_archived: Optional[Callable[[List[int]], None]] = None,
+    ) -> None:
+        self.cfg = cfg
+        self.policy = policy or RetentionPolicy.from_config(cfg)
+        self.on_archived = on_archived
+        self.last_result: Optional[RetentionResult] = None
+        self.last_error: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None or not self.policy.enabled:
+            return
+        self._thread = threading.Thread(target=self._loop, name="retention", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.last_result = apply_retention(self.cfg, self.policy, on_archived=self.on_archived)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+            self._stop.wait(self.cfg.retention_interval_s)
+
+
+_scheduler: Optional[RetentionScheduler] = None
+
+
+def start_retention(
+    cfg: AppConfig,
+    on_archived: Optional[Callable[[List[int]], None]] = None,
+) -> RetentionScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = RetentionScheduler(cfg, on_archived=on_archived)
+        _scheduler.start()
+    return _scheduler
+
+
+def main() -> None:
+    import argparse
+
+    from lokal_agent.core.storage.db import init_db
+
+    ap = argparse.ArgumentParser(description="Retention einmalig ausführen bzw. DB auf inkrementelles VACUUM umstellen.")
+    ap.add_argument(
+        "--convert-vacuum",
+        action="store_true",
+        help="bestehende DB einmalig auf auto_vacuum=INCREMENTAL umstellen (volles VACUUM, UI/API vorher stoppen)",
+    )
+    args = ap.parse_args()
+
+    cfg = AppConfig()
+    init_db(cfg)
+    if args.convert_vacuum:
+        changed = convert_to_incremental_vacuum(cfg)
+        print("auto_vacuum=INCREMENTAL" + (" (umgestellt)" if changed else " (war bereits aktiv)"))
+        return
+
+    result = apply_retention(cfg)
+    print(
+        f"archiviert: {len(result.archived_runs)} Runs in {len(result.bundles)} Bundles, "
+        f"Blobs entfernt: {result.removed_blobs}, Seiten freigegeben: {result.freed_pages}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,24 @@
 ﻿from __future__ import annotations
 
+import asyncio
 import os
 import threading
 from dataclasses import dataclass
-from queue import Queue, Empty
-from typing import Optional
+from typing import Dict, Optional, Set, Tuple
 from pathlib import Path
 
-from nicegui import ui
+from nicegui import Client, background_tasks, ui
 import requests
 
 from lokal_agent.core.config import AppConfig
+from lokal_agent.core.indexing.watcher import start_index_watcher
 from lokal_agent.core.storage.db import (
     init_db,
     upsert_project,
     create_run,
     list_messages,
 )
+from lokal_agent.core.storage.reports import load_report, report_url
 from lokal_agent.core.agent.runner import run_agent, DummyAgent
 
 import subprocess
@@ -52,8 +54,8 @@ def kill_port(port: int) -> None:
 # ------------------------
 cfg = AppConfig()
 init_db(cfg)
-
-event_q: Queue = Queue()
+if cfg.index_watcher:
+    start_index_watcher(cfg)
 
 
 @dataclass
@@ -62,34 +64,88 @@ class UiState:
     start_message: str = ""
     run_id: Optional[int] = None
     status: str = "IDLE"
+    busy: bool = False  # Run läuft -> kein zweiter Start aus diesem Tab
     report_text: str = ""
+    partial_report: str = ""  # LOCAL: Report-Abschnitte, sobald sie geschrieben sind; API: nach Abschluss geladen
     mode: str = "LOCAL"  # LOCAL | API
     api_base_url: str = "http://127.0.0.1:8000"
 
 
-state = UiState()
+class ClientSession:
+    """
+    Zustand + Event-Queue eines Browser-Tabs.
+    Worker-Threads liefern Events thread-safe in den Event-Loop des Clients;
+    der Client wartet darauf (kein Polling). Jedes Event trägt die run_id seines Runs
+    (None, solange der Run noch keine hat).
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.state = UiState()
+        self._loop = loop
+        self._q: asyncio.Queue = asyncio.Queue()
+
+    def put(self, run_id: Optional[int], kind: str, payload: str) -> None:
+        if self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._q.put_nowait, (run_id, kind, payload))
+
+    async def get(self) -> Tuple[Optional[int], str, str]:
+        return await self._q.get()
+
+
+class EventHub:
+    """Fan-out: verteilt Run-Events an alle Sessions, die diesen Run beobachten."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._subs: Dict[int, Set[ClientSession]] = {}
+
+    def subscribe(self, run_id: int, session: ClientSession) -> None:
+        with self._lock:
+            self._subs.setdefault(run_id, set()).add(session)
+
+    def unsubscribe(self, session: ClientSession) -> None:
+        with self._lock:
+            for run_id in list(self._subs):
+                subs = self._subs[run_id]
+                subs.discard(session)
+                if not subs:
+                    del self._subs[run_id]
+
+    def publish(self, run_id: int, kind: str, payload: str) -> None:
+        with self._lock:
+            subs = list(self._subs.get(run_id, ()))
+        for session in subs:
+            session.put(run_id, kind, payload)
+
+
+hub = EventHub()
 
 
 # ------------------------
 # Workers
 # ------------------------
-def _run_worker_local(project_path: str, start_message: str):
+def _run_worker_local(session: ClientSession, project_path: str, start_message: str):
     try:
         proj = upsert_project(cfg, project_path)
         run = create_run(cfg, proj.id, start_message)
-        state.run_id = run.id
-        event_q.put(("status", f"RUNNING (run_id={run.id})"))
+        session.state.run_id = run.id
+        hub.subscribe(run.id, session)
+        hub.publish(run.id, "status", f"RUNNING (run_id={run.id})")
 
-        final = run_agent(cfg, DummyAgent(), run.id, project_path, start_message)
-        event_q.put(("final", final.summary))
+        final = run_agent(
+            cfg, DummyAgent(), run.id, project_path, start_message,
+            on_section=lambda title, text: hub.publish(run.id, "section", text),
+        )
+        hub.publish(run.id, "final", final.summary)
     except Exception as e:
-        event_q.put(("error", str(e)))
+        session.put(session.state.run_id, "error", str(e))
 
 
-def _run_worker_api(project_path: str, start_message: str):
+def _run_worker_api(session: ClientSession, project_path: str, start_message: str):
     try:
-        event_q.put(("status", "RUNNING (API)"))
-        url = state.api_base_url.rstrip("/") + "/runs"
+        session.put(None, "status", "RUNNING (API)")
+        url = session.state.api_base_url.rstrip("/") + "/runs"
         r = requests.post(
             url,
             json={"project_path": project_path, "start_message": start_message},
@@ -97,17 +153,27 @@ def _run_worker_api(project_path: str, start_message: str):
         )
         r.raise_for_status()
         data = r.json()
-        state.run_id = data.get("run_id")
+        session.state.run_id = data.get("run_id")
         final = data.get("final", {})
-        event_q.put(("final", final.get("summary", "API run completed.")))
+        if session.state.run_id is not None:
+            # Report-Artefakt ist eine Adresse der API, kein Dateipfad
+            rr = requests.get(session.state.api_base_url.rstrip("/") + report_url(session.state.run_id), timeout=60)
+            if rr.ok:
+                session.state.partial_report = rr.text
+        session.put(session.state.run_id, "final", final.get("summary", "API run completed."))
     except Exception as e:
-        event_q.put(("error", f"API error: {e}"))
+        session.put(session.state.run_id, "error", f"API error: {e}")
 
 
 # ------------------------
 # UI actions
 # ------------------------
-def start_run():
+def start_run(session: ClientSession):
+    state = session.state
+    if state.busy:
+        ui.notify("Es läuft bereits ein Run.", type="warning")
+        return
+
     if not state.project_path.strip():
         ui.notify("Projektordner fehlt.", type="warning")
         return
@@ -120,60 +186,94 @@ def start_run():
         ui.notify("Startnachricht fehlt.", type="warning")
         return
 
+    # Events des vorherigen Runs nicht mehr in diesen Tab liefern
+    hub.unsubscribe(session)
+    state.busy = True
     state.status = "STARTING"
     state.report_text = ""
+    state.partial_report = ""
     state.run_id = None
 
     worker = _run_worker_api if state.mode == "API" else _run_worker_local
     threading.Thread(
         target=worker,
-        args=(state.project_path, state.start_message),
+        args=(session, state.project_path, state.start_message),
         daemon=True,
     ).start()
 
 
-def refresh_view(status_label, report_area, chat_column):
-    changed = False
-    while True:
-        try:
-            kind, payload = event_q.get_nowait()
-        except Empty:
-            break
-
-        changed = True
-        if kind == "status":
-            state.status = payload
-        elif kind == "final":
-            state.status = "COMPLETED"
-            if state.mode == "LOCAL" and state.run_id:
-                msgs = list_messages(cfg, state.run_id)
-                state.report_text = (
-                    f"Run {state.run_id} abgeschlossen\n\n"
-                    f"{payload}\n\n"
-                    + "\n\n".join([f"[{m.role}] {m.content}" for m in msgs])
-                )
-            else:
-                state.report_text = payload
-        elif kind == "error":
-            state.status = "FAILED"
+async def apply_event(
+    session: ClientSession,
+    run_id: Optional[int],
+    kind: str,
+    payload: str,
+    status_label,
+    report_area,
+    chat_column,
+):
+    state = session.state
+    if run_id is not None and run_id != state.run_id:
+        return  # verspätetes Event eines früheren Runs
+
+    if kind == "section":
+        # Teil-Report sofort anzeigen; Chat nur neu laden, wenn Abschnitte auch als Messages landen
+        state.partial_report += payload
+        report_area.value = state.report_text = state.partial_report
+        if not cfg.stream_report_messages:
+            return
+
+    msgs = []
+    if state.mode == "LOCAL" and state.run_id:
+        msgs = await asyncio.to_thread(list_messages, cfg, state.run_id)
+
+    if kind == "status":
+        state.status = payload
+    elif kind == "final":
+        state.busy = False
+        state.status = "COMPLETED"
+        if state.mode == "LOCAL" and state.run_id:
+            # vollständigen Report aus dem Blob-Store lesen (Abschnitte können bei späten Tabs fehlen)
+            blob = await asyncio.to_thread(load_report, cfg, state.run_id)
+            if blob is not None:
+                state.partial_report = blob.data.decode("utf-8")
+        if state.partial_report:
+            state.report_text = f"Run {state.run_id} abgeschlossen\n\n{payload}\n\n{state.partial_report}"
+        elif state.mode == "LOCAL" and state.run_id:
+            state.report_text = (
+                f"Run {state.run_id} abgeschlossen\n\n"
+                f"{payload}\n\n"
+                + "\n\n".join([f"[{m.role}] {m.content}" for m in msgs])
+            )
+        else:
             state.report_text = payload
+    elif kind == "error":
+        state.busy = False
+        state.status = "FAILED"
+        state.report_text = payload
 
-    if changed:
-        status_label.text = f"Status: {state.status}"
-        report_area.value = state.report_text
+    status_label.text = f"Status: {state.status}"
+    report_area.value = state.report_text
 
-        chat_column.clear()
-        if state.mode == "LOCAL" and state.run_id:
-            for m in list_messages(cfg, state.run_id):
-                with chat_column:
-                    ui.markdown(f"**{m.role}**\n\n{m.content}")
+    chat_column.clear()
+    for m in msgs:
+        with chat_column:
+            ui.markdown(f"**{m.role}**\n\n{m.content}")
+
+
+async def consume_events(session: ClientSession, status_label, report_area, chat_column):
+    while True:
+        run_id, kind, payload = await session.get()
+        await apply_event(session, run_id, kind, payload, status_label, report_area, chat_column)
 
 
 # ------------------------
 # UI Layout
 # ------------------------
 @ui.page("/")
-def main_page():
+def main_page(client: Client):
+    session = ClientSession(asyncio.get_running_loop())
+    state = session.state
+
     dark = ui.dark_mode()
     dark.enable()
 
@@ -206,7 +306,7 @@ def main_page():
     ).classes("w-full").bind_value_to(state, "start_message")
 
     with ui.row().classes("items-center"):
-        ui.button("RUN STARTEN", on_click=start_run)
+        ui.button("RUN STARTEN", on_click=lambda: start_run(session))
         status_label = ui.label("Status: IDLE")
 
     ui.separator()
@@ -221,7 +321,13 @@ def main_page():
             report_area.props("rows=18")
             report_area.props("disable")
 
-    ui.timer(0.5, lambda: refresh_view(status_label, report_area, chat_column))
+    consumer = background_tasks.create(consume_events(session, status_label, report_area, chat_column))
+
+    def _on_disconnect():
+        consumer.cancel()
+        hub.unsubscribe(session)
+
+    client.on_disconnect(_on_disconnect)
 
 
 # ------------------------